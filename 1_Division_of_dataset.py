@@ -1,98 +1,95 @@
+import argparse
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from shutil import copyfile
 import matplotlib.pyplot as plt
+from manifest import SPLITS, build_manifest, read_manifest, write_manifest
 
-# Define the base directory
-base_dir = "C:\\BSD"
+def split_path(base_dir, row):
+    # Location of a file in the <split>/<species>/ folders
+    return os.path.join(base_dir, row['split'], row['species'], os.path.basename(row['path']))
 
-# Define the paths for train, test, and validation directories
-train_dir = os.path.join(base_dir, "train")
-test_dir = os.path.join(base_dir, "test")
-validate_dir = os.path.join(base_dir, "validate")
+def materialise(base_dir, row, mode):
+    # Place one file into <split>/<species>/ as a hard link, symbolic link or copy
+    source_filepath = os.path.join(base_dir, *row['path'].split('/'))
+    dest_filepath = split_path(base_dir, row)
+    os.makedirs(os.path.dirname(dest_filepath), exist_ok=True)
+    if os.path.lexists(dest_filepath):
+        os.remove(dest_filepath)
+    if mode == 'hardlink':
+        try:
+            os.link(source_filepath, dest_filepath)
+            return
+        except OSError:
+            # Different drive or a file system without hard links
+            pass
+    elif mode == 'symlink':
+        os.symlink(os.path.abspath(source_filepath), dest_filepath)
+        return
+    shutil.copyfile(source_filepath, dest_filepath)
 
-# Create directories if they don't exist
-os.makedirs(train_dir, exist_ok=True)
-os.makedirs(test_dir, exist_ok=True)
-os.makedirs(validate_dir, exist_ok=True)
+def remove_materialised(base_dir, row):
+    filepath = split_path(base_dir, row)
+    if os.path.lexists(filepath):
+        os.remove(filepath)
 
-# Define the bird folders
-bird_folders = ["cuckoo", "sparrow", "crow", "laughing_dove", "ambient"]
+def plot_split(rows):
+    # Plotting the dataset split for existing bird folders
+    labels = sorted({row['species'] for row in rows})
+    counts = {split: [sum(1 for row in rows if row['species'] == bird and row['split'] == split) for bird in labels]
+              for split in SPLITS}
+    x = np.arange(len(labels))
+    width = 0.3
 
-# Define the percentage split
-train_split = 0.7
-test_split = 0.2
-validate_split = 0.1
+    plt.figure(figsize=(10, 6))
+    plt.bar(x - width, counts['train'], width, label='Train')
+    plt.bar(x, counts['validate'], width, label='Validate')
+    plt.bar(x + width, counts['test'], width, label='Test')
+    plt.xlabel('Bird Species')
+    plt.ylabel('Number of Files')
+    plt.title('Division of Dataset by Bird Species')
+    plt.xticks(x, labels)
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
 
-# Initialize lists to store the number of files for each bird
-num_train_files = []
-num_test_files = []
-num_validate_files = []
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the dataset into train, test and validate sets")
+    parser.add_argument('--base-dir', default="C:\\BSD", help="Folder holding dataset/ and the split folders")
+    parser.add_argument('--seed', type=int, default=42, help="Seed for the order new recordings are assigned in")
+    parser.add_argument('--mode', choices=['hardlink', 'symlink', 'copy', 'none'], default='hardlink',
+                        help="How to create the split folders, 'none' only writes the manifest")
+    parser.add_argument('--workers', type=int, default=8, help="Threads used to create the split folders")
+    parser.add_argument('--plot', action='store_true', help="Show a bar chart of the split")
+    args = parser.parse_args()
 
-# Loop through each bird folder
-for bird_folder in bird_folders:
-    # Define the path to the bird dataset directory
-    dataset_directory = os.path.join(base_dir, "dataset", bird_folder)
-    
-    if not os.path.exists(dataset_directory):
-        print(f"Dataset directory for {bird_folder} does not exist.")
-        continue
-    
-    # Get the list of unique files in the dataset directory
-    file_list = list(set(os.listdir(dataset_directory)))
-    
-    # Shuffle the file list
-    np.random.shuffle(file_list)
-    
-    # Create subdirectories in train, test, and validate directories for the bird
-    os.makedirs(os.path.join(train_dir, bird_folder), exist_ok=True)
-    os.makedirs(os.path.join(test_dir, bird_folder), exist_ok=True)
-    os.makedirs(os.path.join(validate_dir, bird_folder), exist_ok=True)
-    
-    # Calculate the number of files for each set
-    num_files = len(file_list)
-    num_train = int(train_split * num_files)
-    num_test = int(test_split * num_files)
-    num_validate = num_files - num_train - num_test
-    
-    # Distribute files to train set
-    for i in range(num_train):
-        source_filepath = os.path.join(dataset_directory, file_list[i])
-        dest_filepath = os.path.join(train_dir, bird_folder, file_list[i])
-        copyfile(source_filepath, dest_filepath)
-    
-    # Distribute files to test set
-    for i in range(num_train, num_train + num_test):
-        source_filepath = os.path.join(dataset_directory, file_list[i])
-        dest_filepath = os.path.join(test_dir, bird_folder, file_list[i])
-        copyfile(source_filepath, dest_filepath)
-    
-    # Distribute files to validation set
-    for i in range(num_train + num_test, num_files):
-        source_filepath = os.path.join(dataset_directory, file_list[i])
-        dest_filepath = os.path.join(validate_dir, bird_folder, file_list[i])
-        copyfile(source_filepath, dest_filepath)
-    
-    # Append the number of files for each set to the respective lists
-    num_train_files.append(num_train)
-    num_test_files.append(num_test)
-    num_validate_files.append(num_validate)
+    base_dir = args.base_dir
+    manifest_path = os.path.join(base_dir, "manifest.csv")
 
-print("Dataset is divided into a Train Dataset, Validation Dataset and Test Dataset in the ratio of 70:10:20.")
+    # Recordings keep the split they had in the previous manifest, so reruns are stable
+    previous_rows = read_manifest(manifest_path)
+    rows = build_manifest(base_dir, os.path.join(base_dir, "dataset"), previous_rows, seed=args.seed)
+    write_manifest(manifest_path, rows)
 
-# Plotting the dataset split for existing bird folders
-labels = [bird_folders[i] for i in range(len(bird_folders)) if os.path.exists(os.path.join(base_dir, "dataset", bird_folders[i]))]
-x = np.arange(len(labels))
-width = 0.3
+    # Only files that are new, changed, moved to another split or missing from the split folders are touched
+    previous = {row['path']: row for row in previous_rows}
+    current = {row['path'] for row in rows}
+    changed = [row for row in rows if previous.get(row['path']) != row]
+    removed = [row for path, row in previous.items() if path not in current]
+    if args.mode != 'none':
+        changed += [row for row in rows if previous.get(row['path']) == row and not os.path.lexists(split_path(base_dir, row))]
+        with ThreadPoolExecutor(args.workers) as pool:
+            list(pool.map(lambda row: remove_materialised(base_dir, row), removed))
+            for row in changed:
+                if row['path'] in previous and previous[row['path']]['split'] != row['split']:
+                    remove_materialised(base_dir, previous[row['path']])
+            list(pool.map(lambda row: materialise(base_dir, row, args.mode), changed))
 
-plt.figure(figsize=(10, 6))
-plt.bar(x - width, num_train_files, width, label='Train')
-plt.bar(x, num_validate_files, width, label='Validate')
-plt.bar(x + width, num_test_files, width, label='Test')
-plt.xlabel('Bird Species')
-plt.ylabel('Number of Files')
-plt.title('Division of Dataset by Bird Species')
-plt.xticks(x, labels)
-plt.legend()
-plt.tight_layout()
-plt.show()
+    print(f"Manifest written to {manifest_path}: {len(changed)} files added or updated, {len(removed)} removed")
+    for bird in sorted({row['species'] for row in rows}):
+        counts = [sum(1 for row in rows if row['species'] == bird and row['split'] == split) for split in SPLITS]
+        print(f"{bird}: " + ", ".join(f"{split} {count}" for split, count in zip(SPLITS, counts)))
+
+    if args.plot:
+        plot_split(rows)
@@ -1,18 +1,12 @@
 import tkinter as tk
 from tkinter import filedialog
-import librosa
-import librosa.display
 import matplotlib.pyplot as plt
 import numpy as np
+from features import load_audio
+from silence import remove_silence
 
-def remove_silence(audio, threshold=0.02, frame_length=1024):
-    # Find non-silent intervals
-    non_silent_intervals = librosa.effects.split(audio, top_db=threshold, frame_length=frame_length)
-    
-    # Concatenate non-silent intervals
-    non_silent_audio = np.concatenate([audio[start:end] for start, end in non_silent_intervals])
-    
-    return non_silent_audio
+# Maximum number of points drawn per plot, longer signals are decimated for display
+MAX_PLOT_POINTS = 200000
 
 def pad_audio(audio, target_length):
     # Pad or truncate audio to match target length
@@ -23,22 +17,26 @@ def pad_audio(audio, target_length):
     
     return padded_audio
 
+def plot_signal(audio, sr):
+    step = max(1, len(audio) // MAX_PLOT_POINTS)
+    plt.plot(np.arange(0, len(audio), step) / sr, audio[::step])
+
 def plot_vibration_graph(original_audio, processed_audio, noise_audio, sr):
     plt.figure(figsize=(10, 6))
 
     # Plot original audio
     plt.subplot(3, 1, 1)
-    plt.plot(np.arange(len(original_audio)) / sr, original_audio)
+    plot_signal(original_audio, sr)
     plt.title('Original Audio Signal')
 
     # Plot processed audio (after silence removal)
     plt.subplot(3, 1, 2)
-    plt.plot(np.arange(len(processed_audio)) / sr, processed_audio)
+    plot_signal(processed_audio, sr)
     plt.title('Signal after Silence Removal')
 
     # Plot noise
     plt.subplot(3, 1, 3)
-    plt.plot(np.arange(len(noise_audio)) / sr, noise_audio)
+    plot_signal(noise_audio, sr)
     plt.title('Noise of Audio')
 
     plt.tight_layout()
@@ -53,13 +51,11 @@ def upload_file():
 def process_audio():
     audio_path = audio_text.get()
     if audio_path:
-        y, sr = librosa.load(audio_path, sr=None)
-        y_length = len(y)
-        processed_length = int(0.025 * y_length)  # 2.5% of audio length
-        y_processed = remove_silence(y[:processed_length])
-        y_processed = pad_audio(y_processed, processed_length)
-        noise_audio = y[:processed_length] - y_processed
-        plot_vibration_graph(y[:processed_length], y_processed, noise_audio, sr)
+        y, sr = load_audio(audio_path, sr=None)
+        y_processed = remove_silence(y)
+        y_processed = pad_audio(y_processed, len(y))
+        noise_audio = y - y_processed
+        plot_vibration_graph(y, y_processed, noise_audio, sr)
 
 # Create a GUI window
 root = tk.Tk()
@@ -1,34 +1,124 @@
+import argparse
+import os
+import time
+from multiprocessing import Pool
 import librosa
 import librosa.display
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
+from features import AUDIO_EXTENSIONS, load_audio
+from instrumentation import timer
 
-def create_spectrogram(audio_file_path, save_path):
-    # Load the audio file
-    y, sr = librosa.load(audio_file_path)
-    
+def plot_spectrogram(fig, y, sr):
     # Compute the spectrogram
-    D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
+    with timer('spectrogram.stft'):
+        S = np.abs(librosa.stft(y))
+    with timer('spectrogram.amplitude_to_db'):
+        D = librosa.amplitude_to_db(S, ref=np.max)
     
     # Display the spectrogram
-    plt.figure(figsize=(10, 4))
-    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-    plt.colorbar(format='%+2.0f dB')
-    plt.title('Log-frequency power spectrogram')
-    plt.xlabel('Time (s)')
-    plt.ylabel('Frequency (Hz)')
+    with timer('spectrogram.plot'):
+        ax = fig.add_subplot()
+        img = librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log', ax=ax)
+        fig.colorbar(img, ax=ax, format='%+2.0f dB')
+        ax.set_title('Log-frequency power spectrogram')
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Frequency (Hz)')
+
+def render_spectrogram(y, sr, save_path):
+    # A Figure created without pyplot isn't kept alive by the pyplot figure manager,
+    # so memory is released as soon as it goes out of scope
+    fig = Figure(figsize=(10, 4))
+    plot_spectrogram(fig, y, sr)
+    
+    # Save the spectrogram image
+    with timer('spectrogram.savefig'):
+        fig.savefig(save_path, format='png')
+
+def create_spectrogram(audio_file_path, save_path):
+    # Load the audio file
+    y, sr = load_audio(audio_file_path)
+    
+    fig = plt.figure(figsize=(10, 4))
+    plot_spectrogram(fig, y, sr)
     
     # Save the spectrogram image
-    plt.savefig(save_path)
+    fig.savefig(save_path)
     
     # Show the plot
     plt.show()
 
-# Provide the paths for the audio file and save location
-audio_file_path = input("Enter the path of the audio file: ")
-#C:\BSD\dataset\cuckoo\XC33104 - Indian Cuckoo - Cuculus micropterus concretus.mp3
-save_path = input("Enter the path to save the spectrogram image: ")
-#C:\BSD\dataset\cuckoo\XC33104 - Indian Cuckoo - Cuculus micropterus concretus.png
-# Call the function to create the spectrogram
-create_spectrogram(audio_file_path, save_path)
-print("Spectrogram Created and Saved Succesfully!")
+def find_jobs(input_dir, output_dir, force=False):
+    # Pair every audio file under input_dir with its PNG under output_dir, keeping the folder layout
+    jobs = []
+    skipped = 0
+    for folder, _, files in os.walk(input_dir):
+        for f in sorted(files):
+            if not f.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            audio_path = os.path.join(folder, f)
+            relative_path = os.path.relpath(audio_path, input_dir)
+            save_path = os.path.join(output_dir, os.path.splitext(relative_path)[0] + '.png')
+
+            # Skip spectrograms that are newer than their audio file
+            if not force and os.path.exists(save_path) and os.path.getmtime(save_path) >= os.path.getmtime(audio_path):
+                skipped += 1
+                continue
+            jobs.append((audio_path, save_path))
+    return jobs, skipped
+
+def process_job(job):
+    audio_path, save_path = job
+    try:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        y, sr = load_audio(audio_path)
+
+        # Write to a temporary file first so an interrupted run never leaves a truncated PNG behind
+        temp_path = save_path + '.tmp'
+        render_spectrogram(y, sr, temp_path)
+        os.replace(temp_path, save_path)
+        return audio_path, None
+    except Exception as e:
+        return audio_path, str(e)
+
+def create_spectrograms(input_dir, output_dir, workers=None, force=False):
+    jobs, skipped = find_jobs(input_dir, output_dir, force)
+    print(f"{len(jobs)} spectrograms to create, {skipped} already up to date")
+    if not jobs:
+        return
+
+    failed = []
+    start = time.perf_counter()
+    # Recycle workers now and then so long runs keep a flat memory profile
+    with Pool(workers, maxtasksperchild=200) as pool:
+        for done, (audio_path, error) in enumerate(pool.imap_unordered(process_job, jobs, chunksize=4), 1):
+            if error:
+                failed.append((audio_path, error))
+            if done % 50 == 0 or done == len(jobs):
+                elapsed = time.perf_counter() - start
+                print(f"[{done}/{len(jobs)}] {done / elapsed:.1f} files/s")
+
+    for audio_path, error in failed:
+        print(f"Failed: {audio_path}: {error}")
+    print(f"Created {len(jobs) - len(failed)} spectrograms in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create spectrogram images from audio files")
+    parser.add_argument('--input', help="Folder to process in batch mode, e.g. dataset or train")
+    parser.add_argument('--output', default='spectrograms', help="Folder to write the spectrograms to in batch mode")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="Recreate spectrograms that are already up to date")
+    args = parser.parse_args()
+
+    if args.input:
+        create_spectrograms(args.input, args.output, args.workers, args.force)
+    else:
+        # Provide the paths for the audio file and save location
+        audio_file_path = input("Enter the path of the audio file: ")
+        #C:\BSD\dataset\cuckoo\XC33104 - Indian Cuckoo - Cuculus micropterus concretus.mp3
+        save_path = input("Enter the path to save the spectrogram image: ")
+        #C:\BSD\dataset\cuckoo\XC33104 - Indian Cuckoo - Cuculus micropterus concretus.png
+        # Call the function to create the spectrogram
+        create_spectrogram(audio_file_path, save_path)
+        print("Spectrogram Created and Saved Succesfully!")
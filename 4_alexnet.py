@@ -1,113 +1,220 @@
+import argparse
 import os
+import shutil
+import time
+from contextlib import nullcontext
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-from torchvision import models, transforms
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
 from sklearn.model_selection import train_test_split
-from PIL import Image
-
-# Define the AlexNet architecture
-class AlexNet(nn.Module):
-    def __init__(self, num_classes=4):
-        super(AlexNet, self).__init__()
-        self.features = nn.Sequential(
-            nn.Conv2d(1, 64, kernel_size=11, stride=4, padding=2),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(kernel_size=3, stride=2),
-            nn.Conv2d(64, 192, kernel_size=5, padding=2),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(kernel_size=3, stride=2),
-            nn.Conv2d(192, 384, kernel_size=3, padding=1),
-            nn.ReLU(inplace=True),
-            nn.Conv2d(384, 256, kernel_size=3, padding=1),
-            nn.ReLU(inplace=True),
-            nn.Conv2d(256, 256, kernel_size=3, padding=1),
-            nn.ReLU(inplace=True),
-            nn.MaxPool2d(kernel_size=3, stride=2),
-        )
-        self.avgpool = nn.AdaptiveAvgPool2d((6, 6))
-        self.classifier = nn.Sequential(
-            nn.Dropout(),
-            nn.Linear(256 * 6 * 6, 4096),
-            nn.ReLU(inplace=True),
-            nn.Dropout(),
-            nn.Linear(4096, 4096),
-            nn.ReLU(inplace=True),
-            nn.Linear(4096, num_classes),
-        )
-
-    def forward(self, x):
-        x = self.features(x)
-        x = self.avgpool(x)
-        x = torch.flatten(x, 1)
-        x = self.classifier(x)
-        return x
-
-# Custom dataset class to load images
-class BirdImageDataset(Dataset):
-    def __init__(self, root_dir, transform=None):
-        self.root_dir = root_dir
-        self.transform = transform
-        self.classes = os.listdir(root_dir)
-        self.images = []
-        self.labels = []
-        for label, bird in enumerate(self.classes):
-            bird_folder = os.path.join(root_dir, bird)
-            if os.path.isdir(bird_folder):
-                image_files = [os.path.join(bird_folder, f) for f in os.listdir(bird_folder) if f.endswith('.png')]
-                self.images.extend(image_files)
-                self.labels.extend([label] * len(image_files))
-                print(f"Processed {len(image_files)} images from {bird_folder}")
-
-    def __len__(self):
-        return len(self.images)
-
-    def __getitem__(self, idx):
-        img_path = self.images[idx]
-        image = Image.open(img_path)
-        label = self.labels[idx]
-        if self.transform:
-            image = self.transform(image)
-        return image, label
-
-# Preprocess images and define transforms
-transform = transforms.Compose([
-    transforms.Grayscale(num_output_channels=1),
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.5], std=[0.5]),
-])
-
-# Define dataset and data loader
-dataset = BirdImageDataset(root_dir='C:\\BSD\\spectrograms', transform=transform)
-train_set, val_set = train_test_split(dataset, test_size=0.2, random_state=42)
-
-train_loader = DataLoader(train_set, batch_size=32, shuffle=True)
-val_loader = DataLoader(val_set, batch_size=32)
-
-# Initialize the model
-model = AlexNet(num_classes=len(dataset.classes))
-
-# Define loss function and optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-# Training loop
-num_epochs = 1
-for epoch in range(num_epochs):
+from alexnet import ARCHITECTURES, DEFAULT_FEATURES, build_model
+from bird_datasets import BirdAudioDataset, PackedBirdDataset
+from evaluation import classification_scores, predict_loader
+from instrumentation import count, timer
+from features import FEATURE_KINDS
+from resources import peak_memory_mb, reset_peak_memory
+
+def build_datasets(args, verbose=True):
+    # Train and validation sets as index subsets, so nothing is loaded until the DataLoader asks for it
+    if args.manifest:
+        train_set = BirdAudioDataset(feature_kind=args.features, manifest=args.manifest, split='train', verbose=verbose)
+        val_set = BirdAudioDataset(feature_kind=args.features, manifest=args.manifest, split='validate', verbose=verbose)
+        return train_set, val_set, train_set.classes, args.features
+
+    # Features packed by pack_features.py are read from a memory-mapped file instead of decoding the audio every epoch
+    if args.feature_store:
+        dataset = PackedBirdDataset(args.feature_store)
+        feature_kind = dataset.feature_kind
+        if feature_kind != args.features:
+            raise SystemExit(f"{args.feature_store} holds '{feature_kind}' features but '{args.features}' are needed, "
+                             f"pack it with --features {args.features} or pass --features {feature_kind}")
+        # Recordings removed or modified after packing would train on stale features
+        packed = os.path.getmtime(args.feature_store + '.npy')
+        stale = [path for path in dataset.paths if not os.path.exists(path) or os.path.getmtime(path) > packed]
+        if stale:
+            raise SystemExit(f"{len(stale)} recordings changed since {args.feature_store} was packed (e.g. {stale[0]}), "
+                             f"re-run pack_features.py")
+    else:
+        dataset = BirdAudioDataset(root_dir=args.data, feature_kind=args.features, verbose=verbose)
+        feature_kind = args.features
+
+    train_indices, val_indices = train_test_split(list(range(len(dataset))), test_size=0.2, random_state=42)
+    return Subset(dataset, train_indices), Subset(dataset, val_indices), dataset.classes, feature_kind
+
+def make_loader(dataset, args, shuffle, sampler=None):
+    options = {}
+    if args.workers > 0:
+        # Keep the worker processes alive between epochs and let each one prepare batches ahead
+        options = {'persistent_workers': True, 'prefetch_factor': args.prefetch_factor}
+    return DataLoader(dataset, batch_size=args.batch_size, shuffle=shuffle and sampler is None, sampler=sampler,
+                      num_workers=args.workers, **options)
+
+def train_one_epoch(model, train_loader, criterion, optimizer, args):
     model.train()
     running_loss = 0.0
-    for inputs, labels in train_loader:
-        optimizer.zero_grad()
-        outputs = model(inputs)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
+    samples = 0
+    data_time = 0.0
+    compute_time = 0.0
+
+    optimizer.zero_grad()
+    batch_start = time.perf_counter()
+    for step, (inputs, labels) in enumerate(train_loader, 1):
+        # Time spent waiting for the DataLoader to hand over the batch
+        loaded = time.perf_counter()
+        data_time += loaded - batch_start
+
+        if args.channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+
+        # Gradients of several batches add up before each optimizer step, giving an effective
+        # batch size of batch_size * accumulation_steps without holding it in memory at once.
+        # Under DDP the gradients are only averaged across processes on the stepping batch;
+        # DDP decides this during the forward pass, so no_sync has to cover it as well as backward.
+        stepping = step % args.accumulation_steps == 0 or step == len(train_loader)
+        sync = model.no_sync() if isinstance(model, DistributedDataParallel) and not stepping else nullcontext()
+        with sync:
+            with timer('train.forward'), torch.autocast('cpu', dtype=torch.bfloat16, enabled=args.bf16):
+                outputs = model(inputs)
+                loss = criterion(outputs, labels)
+            with timer('train.backward'):
+                (loss / args.accumulation_steps).backward()
+        if stepping:
+            with timer('train.optimizer_step'):
+                optimizer.step()
+                optimizer.zero_grad()
+        count('train.samples', inputs.size(0))
         running_loss += loss.item() * inputs.size(0)
+        samples += inputs.size(0)
+
+        batch_start = time.perf_counter()
+        compute_time += batch_start - loaded
+
+    return running_loss / max(samples, 1), samples, data_time, compute_time
+
+def save_checkpoint(path, model, optimizer, epoch, classes, feature_kind, arch):
+    # Model, optimizer and epoch, so a long run can resume; written to a temporary file first
+    # so an interruption while saving keeps the previous checkpoint
+    checkpoint = {
+        'state_dict': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'epoch': epoch,
+        'arch': arch,
+        'classes': classes,
+        'features': feature_kind,
+    }
+    torch.save(checkpoint, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the bird species classifier")
+    parser.add_argument('--data', default='C:\\BSD\\dataset', help="Folder with <species>/<audio> files")
+    # A packed store has no manifest splits, so the two are alternative sources of recordings
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--feature-store', help="Train on a store written by pack_features.py instead of --data, e.g. features/dataset")
+    source.add_argument('--manifest', help="Use the train/validate splits of the manifest written by 1_Division_of_dataset.py")
+    parser.add_argument('--arch', default='alexnet', choices=sorted(ARCHITECTURES), help="Model architecture")
+    parser.add_argument('--features', choices=FEATURE_KINDS, help="'stft' (log-magnitude) or 'mel' (log-mel), default depends on --arch")
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--workers', type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument('--prefetch-factor', type=int, default=2, help="Batches prepared ahead by each worker")
+    parser.add_argument('--threads', type=int, help="Threads used by torch for the model (default: torch's choice)")
+    parser.add_argument('--channels-last', action='store_true', help="Use the channels-last memory format")
+    parser.add_argument('--compile', action='store_true', help="Compile the model with torch.compile")
+    parser.add_argument('--bf16', action='store_true', help="Run forward passes under bfloat16 autocast on the CPU")
+    parser.add_argument('--accumulation-steps', type=int, default=1, help="Batches per optimizer step")
+    parser.add_argument('--checkpoint', default='checkpoint.pth', help="Checkpoint written every --checkpoint-every epochs")
+    parser.add_argument('--checkpoint-every', type=int, default=1, help="Epochs between checkpoints, 0 to disable")
+    parser.add_argument('--resume', action='store_true', help="Continue from --checkpoint if it exists")
+    parser.add_argument('--output', default='alexnet.pth')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    args.features = args.features or DEFAULT_FEATURES[args.arch]
+
+    # Distributed data-parallel training when started by torchrun with more than one process
+    distributed = int(os.environ.get('WORLD_SIZE', 1)) > 1
+    if distributed:
+        dist.init_process_group('gloo')
+    is_main = not distributed or dist.get_rank() == 0
+
+    # Define dataset and data loader, each process reads its own shard of the training set
+    # and only rank 0, which runs the validation, keeps workers for the validation set
+    train_set, val_set, classes, feature_kind = build_datasets(args, verbose=is_main)
+    train_sampler = DistributedSampler(train_set, shuffle=True, seed=42) if distributed else None
+    train_loader = make_loader(train_set, args, shuffle=True, sampler=train_sampler)
+    val_loader = make_loader(val_set, args, shuffle=False) if is_main else None
+
+    # Initialize the model
+    model = build_model(args.arch, len(classes))
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    # Define loss function and optimizer
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+
+    # Every process loads the checkpoint, so the optimizer state matches on all of them
+    start_epoch = 0
+    if args.resume and os.path.exists(args.checkpoint):
+        checkpoint = torch.load(args.checkpoint, map_location='cpu')
+        model.load_state_dict(checkpoint['state_dict'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        start_epoch = checkpoint['epoch'] + 1
+        if is_main:
+            print(f"Resuming from {args.checkpoint} after epoch {start_epoch}")
+
+    # The DDP and compiled wrappers share their parameters with model, which is what gets saved
+    train_model = DistributedDataParallel(model) if distributed else model
+    train_model = torch.compile(train_model) if args.compile else train_model
+
+    # Training loop
+    for epoch in range(start_epoch, args.epochs):
+        if train_sampler:
+            train_sampler.set_epoch(epoch)
+        reset_peak_memory()
+        epoch_start = time.perf_counter()
+        epoch_loss, samples, data_time, compute_time = train_one_epoch(train_model, train_loader, criterion, optimizer, args)
+        epoch_time = time.perf_counter() - epoch_start
+        peak = peak_memory_mb()
+
+        # Loss and throughput over all processes
+        if distributed:
+            totals = torch.tensor([epoch_loss * samples, samples], dtype=torch.float64)
+            dist.all_reduce(totals)
+            epoch_loss = (totals[0] / max(totals[1], 1)).item()
+            samples = int(totals[1])
+
+        if is_main:
+            print(f"Epoch [{epoch+1}/{args.epochs}], Train Loss: {epoch_loss:.4f}")
+            print(f"  {epoch_time:.1f}s total, {data_time:.1f}s waiting for data, {compute_time:.1f}s compute, "
+                  f"{samples / epoch_time:.1f} samples/s" + (f", peak RSS {peak:.0f} MB" if peak is not None else ""))
+
+            # Validation on rank 0 only, with the unwrapped model
+            scores = classification_scores(*predict_loader(model, val_loader))
+            if scores['samples']:
+                print(f"  Validation: accuracy {scores['accuracy']:.1%}, macro F1 {scores['macro_f1']:.3f} on {scores['samples']} samples")
+
+        if args.checkpoint_every and (epoch + 1) % args.checkpoint_every == 0:
+            if is_main:
+                save_checkpoint(args.checkpoint, model, optimizer, epoch, classes, feature_kind, args.arch)
+            if distributed:
+                dist.barrier()
 
-    epoch_loss = running_loss / len(train_set)
-    print(f"Epoch [{epoch+1}/{num_epochs}], Train Loss: {epoch_loss:.4f}")
+    # Save the trained model together with its architecture and the class names and features it was trained on
+    if is_main:
+        torch.save({'state_dict': model.state_dict(), 'arch': args.arch, 'classes': classes, 'features': feature_kind}, args.output)
+        # The manifest trained on, so incremental_train.py only picks up recordings added after it
+        if args.manifest:
+            shutil.copyfile(args.manifest, args.output + '.manifest.csv')
+    if distributed:
+        dist.destroy_process_group()
 
-# Save the trained model
-torch.save(model.state_dict(), 'alexnet.pth')
+if __name__ == "__main__":
+    main()
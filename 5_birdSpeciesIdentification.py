@@ -1,19 +1,70 @@
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, ttk
 from PIL import Image, ImageTk
 import os
-import torch
-import torch.nn as nn
-import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms
-from alexnet import AlexNet
-import pygame
-
-# Load the pretrained model
-model = AlexNet(num_classes=4)
-model.load_state_dict(torch.load('alexnet.pth'))
-model.eval()
+import threading
+
+def choose_model(model_path='alexnet.pth', export_path='alexnet_int8.pt'):
+    # Prefer the quantized TorchScript export from export_model.py, unless the checkpoint was
+    # retrained after it was exported
+    if os.path.exists(export_path) and (not os.path.exists(model_path) or os.path.getmtime(export_path) >= os.path.getmtime(model_path)):
+        return export_path
+    return model_path
+
+MODEL_PATH = choose_model()
+
+# Embedding index built by embedding_index.py, used to show the closest reference recordings
+INDEX_PATH = os.path.join('index', 'dataset')
+
+# torch, librosa and pygame take seconds to import, so they are imported and the model is loaded
+# on a background thread once the window is up
+class Backend:
+    def __init__(self, model_path=MODEL_PATH):
+        self.model_path = model_path
+        self.predictor = None
+        self.jobs = None
+        self.mixer = None
+        self.error = None
+        self.ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def _load(self):
+        try:
+            import audio_cache
+            from inference import BirdPredictor
+            from prediction_queue import PredictionQueue
+            # Keep recently decoded uploads in memory, so predicting the same file again skips the decode
+            audio_cache.configure(max_memory_bytes=256 * 2**20)
+            self.predictor = BirdPredictor(self.model_path)
+            search = None
+            if os.path.exists(INDEX_PATH + '.json'):
+                from embedding_index import SimilaritySearch
+                try:
+                    # Shares the predictor's model when both use the same float checkpoint
+                    search = SimilaritySearch(INDEX_PATH, self.predictor.model, self.model_path)
+                except ValueError as e:
+                    # Built from a checkpoint that has since been retrained, the neighbours would be wrong
+                    print(f"Not showing similar recordings: {e}")
+                # The index reuses the prediction's model input, so it must be built on the same features
+                if search and search.feature_kind != self.predictor.feature_kind:
+                    search = None
+            self.jobs = PredictionQueue(self.predictor, search=search)
+            self.mixer = init_mixer()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+def init_mixer():
+    # Initialised once for the whole app; without an audio device predictions still work, silently
+    import pygame
+    try:
+        pygame.mixer.init()
+    except pygame.error:
+        return None
+    return pygame.mixer
 
 class BasePage(tk.Frame):
     def __init__(self, parent, background_photo, title):
@@ -53,9 +104,25 @@ class BirdSpeciesDetectionApp(tk.Tk):
             messagebox.showerror("Error", "Background image not found.")
             self.destroy()
 
+        # Ready indicator for the model loading in the background
+        self.status_label = tk.Label(self, text="Loading model...", font=("Arial", 10), bg="white")
+        self.status_label.pack(side="bottom", fill="x")
+        self.backend = Backend()
+        self.backend.start()
+        self.after(100, self.check_backend)
+
         self.current_page = None
         self.show_entry_page()
 
+    def check_backend(self):
+        # Tk widgets may only be touched from the main thread, so poll the loader instead of calling back
+        if not self.backend.ready.is_set():
+            self.after(100, self.check_backend)
+        elif self.backend.error:
+            self.status_label.configure(text=f"Could not load the model: {self.backend.error}", fg="red")
+        else:
+            self.status_label.configure(text=f"Model ready ({self.backend.model_path})")
+
     def show_entry_page(self):
         self.current_page = EntryPage(self, self.background_photo)
         self.current_page.pack(fill="both", expand=True)
@@ -103,7 +170,7 @@ class LoginPage(BasePage):
             messagebox.showerror("Error", "Invalid username or password")
 
 class SpectrogramDisplay(tk.Toplevel):
-    def __init__(self, parent, image_path, predicted_bird):
+    def __init__(self, parent, spectrogram_image, predicted_bird, probability, other_predictions, neighbours=()):
         super().__init__(parent)
         self.title("Bird Species Detection - Output")
         self.geometry("900x500")
@@ -117,11 +184,22 @@ class SpectrogramDisplay(tk.Toplevel):
         frame.pack(expand=True, fill="both")
 
         # Predicted Bird Label
-        bird_label = tk.Label(frame, text="Predicted Bird: " + predicted_bird, font=("Arial", 16, "bold"))
+        bird_label = tk.Label(frame, text=f"Predicted Bird: {predicted_bird} ({probability:.1%})", font=("Arial", 16, "bold"))
         bird_label.pack(pady=10)
 
-        # Load and display the spectrogram image
-        spectrogram_image = Image.open(image_path)
+        # Runner-up species
+        if other_predictions:
+            others = ", ".join(f"{name} ({p:.1%})" for name, p in other_predictions)
+            others_label = tk.Label(frame, text="Other candidates: " + others, font=("Arial", 12))
+            others_label.pack()
+
+        # Closest reference recordings from the embedding index
+        if neighbours:
+            closest = ", ".join(f"{os.path.basename(n['path'])} ({n['species']}, {n['similarity']:.2f})" for n in neighbours)
+            closest_label = tk.Label(frame, text="Closest recordings: " + closest, font=("Arial", 10), wraplength=850)
+            closest_label.pack()
+
+        # Display the spectrogram the model was given
         spectrogram_image = spectrogram_image.resize((400, 400))
         spectrogram_photo = ImageTk.PhotoImage(spectrogram_image)
         spectrogram_label = tk.Label(frame, image=spectrogram_photo)
@@ -161,65 +239,99 @@ class SpectrogramDisplay(tk.Toplevel):
 class UploadPage(BasePage):
     def __init__(self, parent, background_photo):
         super().__init__(parent, background_photo, "Bird Species Detection - Upload")
-        
-        # Initialize pygame mixer
-        pygame.mixer.init()
-        
-        # Save the path to the spectrogram folder
-        self.spectrogram_folder = "spectrograms"
+        self.backend = parent.backend
+        self.polling = False
 
-        # Upload Audio Button
+        # Upload Audio Button, several files can be selected and are predicted one after another
         upload_button = tk.Button(self, text="Upload Audio", command=self.upload_audio, font=("Arial", 14))
         upload_button.place(relx=0.5, rely=0.4, anchor="center")
 
-        # Text Field for Audio File
+        # Text Field for Audio Files, separated by ';'
         self.audio_entry = tk.Entry(self, font=("Arial", 14), width=40)
         self.audio_entry.place(relx=0.5, rely=0.5, anchor="center")
 
         # Predict Bird Button
         predict_button = tk.Button(self, text="Predict Bird", command=self.predict_bird, font=("Arial", 14))
-        predict_button.place(relx=0.5, rely=0.6, anchor="center")
+        predict_button.place(relx=0.4, rely=0.6, anchor="center")
+
+        # Cancel Button for the files still waiting
+        cancel_button = tk.Button(self, text="Cancel", command=self.cancel_predictions, font=("Arial", 14))
+        cancel_button.place(relx=0.6, rely=0.6, anchor="center")
+
+        # Progress of the queued files
+        self.progress_bar = ttk.Progressbar(self, length=300, mode="determinate")
+        self.progress_bar.place(relx=0.5, rely=0.7, anchor="center")
+        self.progress_label = tk.Label(self, text="", font=("Arial", 12), bg="white")
+        self.progress_label.place(relx=0.5, rely=0.75, anchor="center")
 
     def upload_audio(self):
-        file_path = filedialog.askopenfilename()
-        if file_path:
+        file_paths = filedialog.askopenfilenames()
+        if file_paths:
             self.audio_entry.delete(0, tk.END)
-            self.audio_entry.insert(0, file_path)
+            self.audio_entry.insert(0, "; ".join(file_paths))
 
     def predict_bird(self):
-        audio_file = self.audio_entry.get()
-        if not audio_file:
+        audio_files = [path.strip() for path in self.audio_entry.get().split(";") if path.strip()]
+        if not audio_files:
             messagebox.showerror("Error", "Please select an audio file.")
             return
-        
-        # Play the audio file
-        pygame.mixer.music.load(audio_file)
-        pygame.mixer.music.play()
-
-        # Get the name of the audio file without extension
-        audio_name = os.path.splitext(os.path.basename(audio_file))[0]
-
-        # Iterate through each bird species folder
-        for folder_name in os.listdir(self.spectrogram_folder):
-            bird_species_folder = os.path.join(self.spectrogram_folder, folder_name)
-            if not os.path.isdir(bird_species_folder):
-                continue
-
-            # Construct the path to the spectrogram image
-            spectrogram_path = os.path.join(bird_species_folder, audio_name + ".png")
-            if os.path.exists(spectrogram_path):
-                # Predict the bird species
-                predicted_bird = folder_name.replace("_", " ").title()  
+        if not self.backend.ready.is_set():
+            messagebox.showinfo("Please wait", "The model is still loading.")
+            return
+        if self.backend.error:
+            messagebox.showerror("Error", f"Could not load the model: {self.backend.error}")
+            return
+
+        # Play the first audio file, formats pygame can't play are still predicted
+        if self.backend.mixer:
+            try:
+                self.backend.mixer.music.load(audio_files[0])
+                self.backend.mixer.music.play()
+            except Exception:
+                pass
+
+        # Predict the bird species in the background, results are picked up by poll_predictions
+        for audio_file in audio_files:
+            self.backend.jobs.submit(audio_file)
+        self.update_progress()
+        if not self.polling:
+            self.polling = True
+            self.after(100, self.poll_predictions)
+
+    def cancel_predictions(self):
+        if self.backend.jobs:
+            self.backend.jobs.cancel()
+
+    def poll_predictions(self):
+        # Runs on the Tk main thread, the only one allowed to create windows
+        from features import tensor_to_image
+        from inference import display_name
+
+        for event in self.backend.jobs.poll():
+            name = os.path.basename(event['path'])
+            if event['status'] == 'error':
+                messagebox.showerror("Error", f"Could not process {name}: {event['error']}")
+            elif event['status'] == 'done':
                 # Display the spectrogram image and predicted bird species
-                self.show_spectrogram(spectrogram_path, predicted_bird)
-                return
-            
-        # If no spectrogram image found
-        messagebox.showerror("Error", "No Bird Found.")
-
-    def show_spectrogram(self, spectrogram_path, predicted_bird):
-        spectrogram_window = SpectrogramDisplay(self, spectrogram_path, predicted_bird)
-        spectrogram_window.mainloop()
+                result = event['result']
+                predictions = [(display_name(species), p) for species, p in result['predictions']]
+                spectrogram_image = Image.fromarray(tensor_to_image(result['spectrogram']))
+                self.show_spectrogram(spectrogram_image, predictions, result.get('neighbours', ()))
+
+        self.update_progress()
+        if self.backend.jobs.busy():
+            self.after(100, self.poll_predictions)
+        else:
+            self.polling = False
+
+    def update_progress(self):
+        finished, submitted = self.backend.jobs.progress()
+        self.progress_bar.configure(maximum=max(submitted, 1), value=finished)
+        self.progress_label.configure(text=f"{finished} of {submitted} files processed" if submitted else "")
+
+    def show_spectrogram(self, spectrogram_image, predictions, neighbours=()):
+        predicted_bird, probability = predictions[0]
+        SpectrogramDisplay(self, spectrogram_image, predicted_bird, probability, predictions[1:], neighbours)
 
 if __name__ == "__main__":
     app = BirdSpeciesDetectionApp()
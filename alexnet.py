@@ -0,0 +1,140 @@
+import json
+import os
+import zipfile
+import torch
+import torch.nn as nn
+
+# Define the AlexNet architecture
+class AlexNet(nn.Module):
+    def __init__(self, num_classes=4):
+        super(AlexNet, self).__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(1, 64, kernel_size=11, stride=4, padding=2),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(kernel_size=3, stride=2),
+            nn.Conv2d(64, 192, kernel_size=5, padding=2),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(kernel_size=3, stride=2),
+            nn.Conv2d(192, 384, kernel_size=3, padding=1),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(384, 256, kernel_size=3, padding=1),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(256, 256, kernel_size=3, padding=1),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(kernel_size=3, stride=2),
+        )
+        self.avgpool = nn.AdaptiveAvgPool2d((6, 6))
+        self.classifier = nn.Sequential(
+            nn.Dropout(),
+            nn.Linear(256 * 6 * 6, 4096),
+            nn.ReLU(inplace=True),
+            nn.Dropout(),
+            nn.Linear(4096, 4096),
+            nn.ReLU(inplace=True),
+            nn.Linear(4096, num_classes),
+        )
+
+    def forward(self, x):
+        x = self.features(x)
+        x = self.avgpool(x)
+        x = torch.flatten(x, 1)
+        x = self.classifier(x)
+        return x
+
+# Compact alternative for spectrogram classification: depthwise-separable convolutions over the
+# log-mel input and global average pooling instead of the large fully connected layers
+class DepthwiseSeparableConv(nn.Sequential):
+    def __init__(self, in_channels, out_channels, stride=1):
+        super(DepthwiseSeparableConv, self).__init__(
+            nn.Conv2d(in_channels, in_channels, kernel_size=3, stride=stride, padding=1, groups=in_channels, bias=False),
+            nn.BatchNorm2d(in_channels),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(in_channels, out_channels, kernel_size=1, bias=False),
+            nn.BatchNorm2d(out_channels),
+            nn.ReLU(inplace=True),
+        )
+
+class CompactNet(nn.Module):
+    def __init__(self, num_classes=4):
+        super(CompactNet, self).__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(1, 32, kernel_size=3, stride=2, padding=1, bias=False),
+            nn.BatchNorm2d(32),
+            nn.ReLU(inplace=True),
+            DepthwiseSeparableConv(32, 64, stride=2),
+            DepthwiseSeparableConv(64, 128, stride=2),
+            DepthwiseSeparableConv(128, 128),
+            DepthwiseSeparableConv(128, 256, stride=2),
+            DepthwiseSeparableConv(256, 256, stride=2),
+        )
+        self.avgpool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Sequential(
+            nn.Dropout(0.2),
+            nn.Linear(256, num_classes),
+        )
+
+    def forward(self, x):
+        x = self.features(x)
+        x = self.avgpool(x)
+        x = torch.flatten(x, 1)
+        x = self.classifier(x)
+        return x
+
+# Model architectures selectable with --arch, and the features each one is trained on by default
+ARCHITECTURES = {'alexnet': AlexNet, 'compact': CompactNet}
+DEFAULT_FEATURES = {'alexnet': 'stft', 'compact': 'mel'}
+
+def build_model(arch, num_classes):
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {arch!r}, expected one of {sorted(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](num_classes=num_classes)
+
+def list_classes(root_dir):
+    # Class labels are the sorted species folder names, so the order is the same on every machine
+    return sorted(d for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d)))
+
+def is_torchscript(model_path):
+    # TorchScript archives carry the model code, checkpoints from 4_alexnet.py only the tensors
+    try:
+        with zipfile.ZipFile(model_path) as f:
+            return any('/code/' in name for name in f.namelist())
+    except zipfile.BadZipFile:
+        return False
+
+def load_model(model_path='alexnet.pth', classes=None, classes_dir='spectrograms'):
+    # Models exported by export_model.py keep the class names and feature kind next to the code
+    if is_torchscript(model_path):
+        extra_files = {'info.json': ''}
+        model = torch.jit.load(model_path, map_location='cpu', _extra_files=extra_files)
+        model.eval()
+        info = json.loads(extra_files['info.json'] or '{}')
+        classes = classes or info.get('classes') or list_classes(classes_dir)
+        return model, {'classes': list(classes), 'features': info.get('features', 'stft'), 'arch': info.get('arch', 'alexnet')}
+
+    # 4_alexnet.py saves the state dict together with the architecture, class names and feature kind,
+    # older checkpoints are a bare AlexNet state dict trained on rendered 'stft' spectrograms
+    checkpoint = torch.load(model_path, map_location='cpu')
+    if 'state_dict' in checkpoint:
+        state_dict = checkpoint['state_dict']
+        classes = classes or checkpoint.get('classes')
+        feature_kind = checkpoint.get('features', 'stft')
+        arch = checkpoint.get('arch', 'alexnet')
+    else:
+        state_dict = checkpoint
+        feature_kind = 'stft'
+        arch = 'alexnet'
+
+    # Fall back to the species folders the model was trained on
+    if classes is None:
+        classes = list_classes(classes_dir)
+
+    # The last classifier weight is the output layer
+    output_weight = [value for key, value in state_dict.items() if key.startswith('classifier.') and key.endswith('.weight')][-1]
+    num_classes = output_weight.shape[0]
+    if len(classes) != num_classes:
+        raise ValueError(f"Model has {num_classes} outputs but {len(classes)} class names were given")
+
+    model = build_model(arch, num_classes)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model, {'classes': list(classes), 'features': feature_kind, 'arch': arch}
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import librosa
+import numpy as np
+
+# The disk layer is enabled by pointing BIRD_AUDIO_CACHE_DIR at a folder
+CACHE_DIR = os.environ.get('BIRD_AUDIO_CACHE_DIR')
+MAX_DISK_MB = int(os.environ.get('BIRD_AUDIO_CACHE_DISK_MB', 10240))
+MAX_MEMORY_MB = int(os.environ.get('BIRD_AUDIO_CACHE_MEMORY_MB', 0))
+
+# Decoded audio cache keyed by file content, target sample rate and mono flag, with an
+# in-process LRU layer in front of an on-disk LRU layer of float32 PCM files
+class AudioCache:
+    def __init__(self, cache_dir=None, max_disk_bytes=MAX_DISK_MB * 2**20, max_memory_bytes=MAX_MEMORY_MB * 2**20):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = None
+        self.file_hashes = {}
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, audio_path, sr, mono=True):
+        # Returned arrays are shared with the cache and must not be modified in place
+        if not self.cache_dir and self.max_memory_bytes <= 0:
+            with self.lock:
+                self.stats['misses'] += 1
+            return librosa.load(audio_path, sr=sr, mono=mono)
+
+        # Resolve the native rate from the file header so the key always holds the real rate
+        if sr is None:
+            sr = librosa.get_samplerate(audio_path)
+        key = f"{self.file_hash(audio_path)}_{sr}_{'mono' if mono else 'multi'}"
+
+        # In-process layer
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self.memory[key]
+
+        # Disk layer
+        y = self._load_from_disk(key)
+        if y is not None:
+            with self.lock:
+                self.stats['disk_hits'] += 1
+        else:
+            with self.lock:
+                self.stats['misses'] += 1
+            y, _ = librosa.load(audio_path, sr=sr, mono=mono)
+            y = y.astype(np.float32, copy=False)
+            self._save_to_disk(key, y)
+        entry = (y, sr)
+
+        self._remember(key, entry)
+        return entry
+
+    def file_hash(self, audio_path):
+        # Content hash, memoised per (path, size, mtime) so unchanged files are only read once
+        stat = os.stat(audio_path)
+        signature = (os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns)
+        digest = self.file_hashes.get(signature)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(audio_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(2**20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self.file_hashes[signature] = digest
+        return digest
+
+    def _remember(self, key, entry):
+        if self.max_memory_bytes <= 0:
+            return
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = entry
+            self.memory_bytes += entry[0].nbytes
+            # Evict the least recently used entries
+            while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+                _, (y, _) = self.memory.popitem(last=False)
+                self.memory_bytes -= y.nbytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            y = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        # Touch the file so eviction sees it as recently used; another process may evict it meanwhile
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return y
+
+    def _save_to_disk(self, key, y):
+        if not self.cache_dir:
+            return
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, y)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = self._scan_disk_bytes()
+            else:
+                self.disk_bytes += os.path.getsize(path)
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk_bytes(self):
+        return sum(e.stat().st_size for e in os.scandir(self.cache_dir) if e.name.endswith('.npy'))
+
+    def _evict_disk(self):
+        # Remove the least recently used files until the cache is back under 90% of its cap
+        entries = sorted((e for e in os.scandir(self.cache_dir) if e.name.endswith('.npy')),
+                         key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        for e in entries:
+            if total <= 0.9 * self.max_disk_bytes:
+                break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self.disk_bytes = total
+
+    def clear_memory(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+
+_default_cache = AudioCache(CACHE_DIR)
+
+def default_cache():
+    return _default_cache
+
+def configure(cache_dir=CACHE_DIR, max_disk_bytes=MAX_DISK_MB * 2**20, max_memory_bytes=MAX_MEMORY_MB * 2**20):
+    # Replace the process-wide cache used by features.load_audio
+    global _default_cache
+    _default_cache = AudioCache(cache_dir, max_disk_bytes, max_memory_bytes)
+    return _default_cache
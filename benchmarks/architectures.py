@@ -0,0 +1,88 @@
+# Parameters, FLOPs, CPU latency and validation accuracy of the model architectures.
+# Run from the repository root: python -m benchmarks.architectures --model alexnet.pth --model compact.pth
+import argparse
+import time
+import torch
+import torch.nn as nn
+from alexnet import ARCHITECTURES, DEFAULT_FEATURES, build_model, load_model
+from bird_datasets import BirdAudioDataset
+from features import IMAGE_SIZE
+
+def count_flops(model, inputs):
+    # Multiply-accumulates of the convolution and linear layers for one forward pass, as FLOPs (2 per MAC)
+    macs = []
+
+    def conv_hook(module, _, output):
+        kernel = module.kernel_size[0] * module.kernel_size[1] * module.in_channels // module.groups
+        macs.append(output.numel() * kernel)
+
+    def linear_hook(module, _, output):
+        macs.append(output.numel() * module.in_features)
+
+    hooks = []
+    for module in model.modules():
+        if isinstance(module, nn.Conv2d):
+            hooks.append(module.register_forward_hook(conv_hook))
+        elif isinstance(module, nn.Linear):
+            hooks.append(module.register_forward_hook(linear_hook))
+    with torch.inference_mode():
+        model(inputs)
+    for hook in hooks:
+        hook.remove()
+    return 2 * sum(macs)
+
+def latency_ms(model, inputs, repeat):
+    with torch.inference_mode():
+        for _ in range(3):
+            model(inputs)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model(inputs)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def accuracy(model, classes, dataset):
+    # Compare by species name, the model's class order may differ from the dataset's
+    correct = 0
+    with torch.inference_mode():
+        for i in range(len(dataset)):
+            inputs, label = dataset[i]
+            correct += classes[model(inputs.unsqueeze(0)).argmax(dim=1).item()] == dataset.classes[label]
+    return correct / max(1, len(dataset))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model architectures")
+    parser.add_argument('--model', action='append', default=[], help="Trained checkpoint, can be given several times")
+    parser.add_argument('--data', default='validate', help="Folder with <species>/<audio> files used for accuracy")
+    parser.add_argument('--manifest', help="Use the validate split of this manifest instead of --data")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    # Trained checkpoints, or untrained models of every architecture when none are given
+    models = []
+    for model_path in args.model:
+        model, info = load_model(model_path)
+        models.append((f"{info['arch']} ({model_path})", model, info))
+    if not models:
+        for arch in ARCHITECTURES:
+            models.append((f"{arch} (untrained)", build_model(arch, 5).eval(), {'arch': arch, 'features': DEFAULT_FEATURES[arch], 'classes': None}))
+
+    single = torch.zeros(1, 1, IMAGE_SIZE, IMAGE_SIZE)
+    batch = torch.zeros(32, 1, IMAGE_SIZE, IMAGE_SIZE)
+    datasets = {}
+    print(f"{'model':<40}{'params M':>10}{'GFLOPs':>9}{'1-sample ms':>13}{'batch-32 ms':>13}{'accuracy':>10}")
+    for name, model, info in models:
+        params = sum(p.numel() for p in model.parameters()) / 1e6
+        gflops = count_flops(model, single) / 1e9
+        if info['classes'] is None:
+            acc = '-'
+        else:
+            # Every model is scored on the same recordings, featurised the way it was trained
+            kind = info['features']
+            if kind not in datasets:
+                datasets[kind] = BirdAudioDataset(args.data, feature_kind=kind, manifest=args.manifest, split='validate' if args.manifest else None)
+            acc = f"{accuracy(model, info['classes'], datasets[kind]):.1%}"
+        print(f"{name:<40}{params:>10.2f}{gflops:>9.2f}{latency_ms(model, single, args.repeat):>13.1f}"
+              f"{latency_ms(model, batch, max(1, args.repeat // 4)):>13.1f}{acc:>10}")
+
+if __name__ == '__main__':
+    main()
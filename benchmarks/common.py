@@ -0,0 +1,10 @@
+import importlib.util
+import os
+
+# The pipeline stages are numbered scripts (e.g. 3_spectrogram.py) which can't be imported by name
+def load_script(filename, module_name=None):
+    module_name = module_name or os.path.splitext(filename)[0].lstrip('0123456789_')
+    spec = importlib.util.spec_from_file_location(module_name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,44 @@
+# Training samples/second of 4_alexnet.py with 1, 2 and 4 local DDP processes started through torchrun.
+# Run from the repository root: python -m benchmarks.ddp_scaling --data train
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+def run(processes, args, tmp_dir):
+    # Split the CPU threads between the processes so every run uses the same cores
+    threads = max(1, (args.threads or os.cpu_count()) // processes)
+    command = [sys.executable, '-m', 'torch.distributed.run', '--standalone', f'--nproc_per_node={processes}',
+               '4_alexnet.py', '--data', args.data, '--arch', args.arch,
+               '--epochs', str(args.epochs), '--batch-size', str(args.batch_size), '--threads', str(threads),
+               '--checkpoint-every', '0', '--output', os.path.join(tmp_dir, f'model_{processes}.pth')]
+    if args.feature_store:
+        command += ['--feature-store', args.feature_store]
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    # The first epoch includes start-up costs, report the last one
+    return float(re.findall(r'([\d.]+) samples/s', output)[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of distributed training across local processes")
+    parser.add_argument('--data', default='train', help="Folder with <species>/<audio> files")
+    parser.add_argument('--feature-store', help="Train on a store written by pack_features.py instead of --data")
+    parser.add_argument('--arch', default='alexnet')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=16, help="Batch size per process")
+    parser.add_argument('--threads', type=int, help="CPU threads shared by all processes (default: all cores)")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = {n: run(n, args, tmp_dir) for n in args.processes}
+
+    base = results[args.processes[0]]
+    print(f"{'processes':<12}{'samples/s':>12}{'speed-up':>10}")
+    for n, throughput in results.items():
+        print(f"{n:<12}{throughput:>12.1f}{throughput / base:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
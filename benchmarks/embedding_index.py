@@ -0,0 +1,58 @@
+# Query latency and recall of the embedding index, exact and with inverted-file lists, on a synthetic
+# collection of clustered embeddings. Run from the repository root: python -m benchmarks.embedding_index
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from embedding_index import EmbeddingIndex
+
+def synthetic_embeddings(size, dim, clusters, seed=42):
+    # Recordings of one species form a cluster, as penultimate-layer embeddings do
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=size)
+    return centres[labels] + 0.5 * rng.normal(size=(size, dim)).astype(np.float32), labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding index queries")
+    parser.add_argument('--size', type=int, default=100000, help="Indexed recordings")
+    parser.add_argument('--embedding-dim', type=int, default=1024, help="Dimensions of the raw embeddings")
+    parser.add_argument('--dim', type=int, default=256, help="PCA dimensions stored in the index")
+    parser.add_argument('--lists', type=int, default=256)
+    parser.add_argument('--n-probe', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    embeddings, labels = synthetic_embeddings(args.size, args.embedding_dim, clusters=200)
+    queries = embeddings[:args.queries] + 0.1 * np.random.default_rng(0).normal(size=(args.queries, args.embedding_dim)).astype(np.float32)
+    paths = [f'recording_{i}' for i in range(args.size)]
+    species = [str(label) for label in labels]
+
+    indexes = {
+        'exact': EmbeddingIndex.build(embeddings, paths, species, {}, args.dim),
+        f'IVF {args.lists} lists': EmbeddingIndex.build(embeddings, paths, species, {}, args.dim, args.lists),
+    }
+
+    exact = [{indexes['exact'].paths[row] for row, _ in indexes['exact'].search(q, args.k)} for q in queries]
+    print(f"{args.size} recordings, {args.embedding_dim}-d embeddings stored as {args.dim}-d vectors")
+    print(f"{'index':<18}{'float16 MB':>12}{'float32 MB':>12}{'query ms':>10}{f'recall@{args.k}':>11}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, index in indexes.items():
+            sizes = []
+            for dtype in ('float16', 'float32'):
+                path = os.path.join(tmp_dir, dtype)
+                index.save(path, dtype)
+                sizes.append(os.path.getsize(path + '.npy') / 2**20)
+            loaded = EmbeddingIndex.load(os.path.join(tmp_dir, 'float16'))
+
+            loaded.search(queries[0], args.k, args.n_probe)
+            start = time.perf_counter()
+            results = [loaded.search(q, args.k, args.n_probe) for q in queries]
+            latency = (time.perf_counter() - start) / len(queries)
+            recall = np.mean([len({loaded.paths[row] for row, _ in result} & truth) / args.k for result, truth in zip(results, exact)])
+            print(f"{name:<18}{sizes[0]:>12.1f}{sizes[1]:>12.1f}{latency * 1000:>10.2f}{recall:>11.1%}")
+
+if __name__ == '__main__':
+    main()
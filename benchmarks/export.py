@@ -0,0 +1,79 @@
+# File size, load time, latency, throughput and validation accuracy of the float model against
+# its TorchScript exports. Run from the repository root: python -m benchmarks.export
+import argparse
+import os
+import tempfile
+import time
+import torch
+from alexnet import load_model
+from bird_datasets import BirdAudioDataset
+from export_model import export_model
+from features import IMAGE_SIZE
+
+def measure(model_path, inputs, labels, classes, repeat):
+    start = time.perf_counter()
+    model, info = load_model(model_path)
+    load_time = time.perf_counter() - start
+
+    single = torch.zeros(1, 1, IMAGE_SIZE, IMAGE_SIZE)
+    batch = torch.zeros(32, 1, IMAGE_SIZE, IMAGE_SIZE)
+    with torch.inference_mode():
+        # Warm-up, TorchScript optimises the graph on the first calls
+        for _ in range(3):
+            model(single)
+            model(batch)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            model(single)
+        latency = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(max(1, repeat // 10)):
+            model(batch)
+        throughput = max(1, repeat // 10) * len(batch) / (time.perf_counter() - start)
+
+        predictions = model(inputs).argmax(dim=1) if len(inputs) else torch.zeros(0, dtype=torch.long)
+    # Compare by species name, the model's class order may differ from the dataset's
+    predicted = [info['classes'][i] for i in predictions.tolist()]
+    accuracy = sum(p == classes[l] for p, l in zip(predicted, labels)) / max(1, len(labels))
+    return {
+        'size_mb': os.path.getsize(model_path) / 2**20,
+        'load_s': load_time,
+        'latency_ms': latency * 1000,
+        'throughput': throughput,
+        'accuracy': accuracy,
+        'predicted': predicted,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the float model with its TorchScript exports")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--data', default='validate', help="Folder with <species>/<audio> files used for accuracy")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    # Score on the features the checkpoint was trained on, 'mel' for the compact network
+    dataset = BirdAudioDataset(args.data, feature_kind=load_model(args.model)[1]['features'])
+    samples = [dataset[i] for i in range(len(dataset))]
+    inputs = torch.stack([x for x, _ in samples]) if samples else torch.zeros(0, 1, IMAGE_SIZE, IMAGE_SIZE)
+    labels = [label for _, label in samples]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        models = {'float (state dict)': args.model}
+        models['float TorchScript'] = os.path.join(tmp_dir, 'float.pt')
+        export_model(args.model, models['float TorchScript'], quantize=False)
+        models['int8 TorchScript'] = os.path.join(tmp_dir, 'int8.pt')
+        export_model(args.model, models['int8 TorchScript'], quantize=True)
+
+        results = {name: measure(path, inputs, labels, dataset.classes, args.repeat) for name, path in models.items()}
+
+    reference = results['float (state dict)']['predicted']
+    print(f"{'model':<20}{'MB':>8}{'load s':>8}{'1-sample ms':>13}{'batch samples/s':>17}{'accuracy':>10}{'agrees':>8}")
+    for name, r in results.items():
+        agreement = sum(a == b for a, b in zip(r['predicted'], reference)) / max(1, len(reference))
+        print(f"{name:<20}{r['size_mb']:>8.1f}{r['load_s']:>8.2f}{r['latency_ms']:>13.1f}"
+              f"{r['throughput']:>17.1f}{r['accuracy']:>10.1%}{agreement:>8.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# Samples/second of the packed memory-mapped store against the datasets that decode files on every access.
+# Run from the repository root: python -m benchmarks.feature_store
+import argparse
+import os
+import tempfile
+import time
+from torch.utils.data import DataLoader
+from bird_datasets import BirdAudioDataset, BirdImageDataset, PackedBirdDataset, image_transform, pack_dataset
+
+def samples_per_second(dataset, epochs, workers):
+    loader = DataLoader(dataset, batch_size=32, shuffle=True, num_workers=workers)
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for _ in loader:
+            pass
+    return epochs * len(dataset) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dataset classes by samples/second")
+    parser.add_argument('--audio', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--images', default='spectrograms', help="Folder with <species>/<png> spectrograms")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=0)
+    args = parser.parse_args()
+
+    audio_dataset = BirdAudioDataset(args.audio)
+    results = {
+        'BirdImageDataset (PNG)': samples_per_second(BirdImageDataset(args.images, image_transform), args.epochs, args.workers),
+        'BirdAudioDataset': samples_per_second(audio_dataset, args.epochs, args.workers),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, 'dataset')
+        start = time.perf_counter()
+        pack_dataset(audio_dataset, store_path, workers=args.workers)
+        print(f"Packed {len(audio_dataset)} samples in {time.perf_counter() - start:.1f}s")
+        results['PackedBirdDataset'] = samples_per_second(PackedBirdDataset(store_path), args.epochs, args.workers)
+
+    print(f"{'dataset':<26}{'samples/s':>12}")
+    for name, rate in results.items():
+        print(f"{name:<26}{rate:>12.1f}")
+
+if __name__ == '__main__':
+    main()
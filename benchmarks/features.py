@@ -0,0 +1,58 @@
+# Clips/second of the in-memory features against rendering a PNG with 3_spectrogram.py and decoding it again.
+# Run from the repository root: python -m benchmarks.features
+import argparse
+import os
+import tempfile
+import time
+import matplotlib
+matplotlib.use('Agg')
+from PIL import Image
+from benchmarks.common import load_script
+from bird_datasets import image_transform
+from features import FEATURE_KINDS, compute_features, find_audio_files, load_audio
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare render-then-decode spectrograms with in-memory features")
+    parser.add_argument('--data', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--limit', type=int, default=20, help="Number of clips to use")
+    args = parser.parse_args()
+
+    spectrogram = load_script('3_spectrogram.py')
+    audio_files = find_audio_files(args.data)[:args.limit]
+    if not audio_files:
+        raise SystemExit(f"No audio files found under {args.data}")
+
+    # Warm-up so one-off costs (JIT compilation, filterbank caches) are not counted
+    y, sr = load_audio(audio_files[0][0])
+    for kind in FEATURE_KINDS:
+        compute_features(y, sr, kind)
+
+    # Decode once up front, both paths start from the same waveform
+    start = time.perf_counter()
+    clips = [load_audio(audio_path) for audio_path, _ in audio_files]
+    decode_time = time.perf_counter() - start
+
+    # Current path: render the plot to PNG, then open, grayscale, resize and normalise it
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        save_path = os.path.join(tmp_dir, 'spectrogram.png')
+        start = time.perf_counter()
+        for y, sr in clips:
+            spectrogram.render_spectrogram(y, sr, save_path)
+            image_transform(Image.open(save_path))
+        render_time = time.perf_counter() - start
+
+    results = {'render + PNG decode': render_time}
+    for kind in FEATURE_KINDS:
+        start = time.perf_counter()
+        for y, sr in clips:
+            compute_features(y, sr, kind)
+        results[f'in-memory {kind}'] = time.perf_counter() - start
+
+    n = len(clips)
+    print(f"{n} clips, audio decode {n / decode_time:.1f} clips/s (shared by both paths)")
+    print(f"{'path':<22}{'clips/s':>10}{'speedup':>10}{'incl. decode':>14}")
+    for name, seconds in results.items():
+        print(f"{name:<22}{n / seconds:>10.1f}{render_time / seconds:>9.1f}x{n / (seconds + decode_time):>14.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Clips/second of the batched torch front-end against featurising each clip with librosa, for
+# batches of fixed-length windows cut from the dataset. Run from the repository root: python -m benchmarks.frontend
+import argparse
+import time
+import numpy as np
+import torch
+from features import FEATURE_KINDS, SAMPLE_RATE, compute_features, find_audio_files, load_audio
+from torch_features import SpectrogramFrontEnd
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the batched torch front-end with per-clip librosa features")
+    parser.add_argument('--data', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--window', type=float, default=5.0, help="Clip length in seconds")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32, 256])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Cut the dataset into fixed-length windows, repeated until the largest batch is filled
+    window_length = int(args.window * SAMPLE_RATE)
+    audio = np.concatenate([load_audio(path)[0] for path, _ in find_audio_files(args.data)])
+    windows = [audio[start:start + window_length] for start in range(0, len(audio) - window_length + 1, window_length)]
+    if not windows:
+        raise SystemExit(f"No {args.window}s windows in the audio under {args.data}")
+    windows = (windows * (max(args.batch_sizes) // len(windows) + 1))[:max(args.batch_sizes)]
+
+    print(f"{'features':<10}{'batch':>7}{'librosa clips/s':>17}{'torch clips/s':>15}{'speed-up':>10}{'max diff':>10}")
+    for kind in FEATURE_KINDS:
+        frontend = SpectrogramFrontEnd(kind)
+        # Warm-up so one-off costs (JIT compilation, filterbank caches, allocator) are not counted
+        compute_features(windows[0], SAMPLE_RATE, kind)
+        with torch.inference_mode():
+            frontend(torch.from_numpy(np.stack(windows[:2])))
+
+        for batch_size in args.batch_sizes:
+            batch = windows[:batch_size]
+            librosa_time, expected = best_time(lambda: torch.stack([compute_features(y, SAMPLE_RATE, kind) for y in batch]), args.repeat)
+            with torch.inference_mode():
+                torch_time, result = best_time(lambda: frontend(torch.from_numpy(np.stack(batch))), args.repeat)
+            difference = (result - expected).abs().max().item()
+            print(f"{kind:<10}{batch_size:>7}{batch_size / librosa_time:>17.1f}{batch_size / torch_time:>15.1f}"
+                  f"{librosa_time / torch_time:>9.1f}x{difference:>10.1e}")
+
+if __name__ == '__main__':
+    main()
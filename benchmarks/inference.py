@@ -0,0 +1,43 @@
+# Latency of the identification app's prediction path on the test clips.
+# Run from the repository root: python -m benchmarks.inference
+import argparse
+import numpy as np
+from features import find_audio_files
+from inference import BirdPredictor
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode / feature / forward latency per clip")
+    parser.add_argument('--data', default='test', help="Folder with <species>/<audio> files")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--repeat', type=int, default=3, help="Passes over the clips after one warm-up pass")
+    args = parser.parse_args()
+
+    predictor = BirdPredictor(args.model)
+    audio_files = find_audio_files(args.data)
+    if not audio_files:
+        raise SystemExit(f"No audio files found under {args.data}")
+
+    # Warm-up pass so one-off costs (allocator, thread pools) are not counted
+    for audio_path, _ in audio_files:
+        predictor.predict(audio_path)
+
+    timings = {'decode': [], 'feature': [], 'forward': [], 'total': []}
+    correct = 0
+    for _ in range(args.repeat):
+        for audio_path, species in audio_files:
+            result = predictor.predict(audio_path)
+            for stage, seconds in result['timings'].items():
+                timings[stage].append(seconds)
+            timings['total'].append(sum(result['timings'].values()))
+            correct += result['predictions'][0][0] == species
+
+    runs = args.repeat * len(audio_files)
+    print(f"{len(audio_files)} clips x {args.repeat} passes")
+    print(f"{'stage':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, values in timings.items():
+        values = np.array(values) * 1000
+        print(f"{stage:<10}{values.mean():>10.1f}{np.percentile(values, 50):>10.1f}{np.percentile(values, 95):>10.1f}")
+    print(f"Top-1 accuracy: {correct / runs:.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Load generator for serve.py: replays the test clips against the server at a given concurrency.
+# Start the server first (python serve.py), then run from the repository root:
+# python -m benchmarks.server_load --concurrency 8
+import argparse
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from features import find_audio_files
+
+def post(url, audio_path, body):
+    query = urllib.parse.urlencode({'filename': os.path.basename(audio_path)})
+    request = urllib.request.Request(f"{url}/predict?{query}", data=body, method='POST')
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        result = json.load(response)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay audio clips against the prediction server")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--data', default='test', help="Folder with <species>/<audio> files")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    audio_files = find_audio_files(args.data)
+    if not audio_files:
+        raise SystemExit(f"No audio files found under {args.data}")
+    bodies = {}
+    for audio_path, _ in audio_files:
+        with open(audio_path, 'rb') as f:
+            bodies[audio_path] = f.read()
+    jobs = [audio_files[i % len(audio_files)][0] for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda audio_path: post(args.url, audio_path, bodies[audio_path]), jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    print(f"{len(jobs)} requests at concurrency {args.concurrency} in {elapsed:.1f}s: {len(jobs) / elapsed:.1f} requests/s")
+    print(f"client latency p50 {np.percentile(latencies, 50):.1f} ms, p95 {np.percentile(latencies, 95):.1f} ms")
+    with urllib.request.urlopen(f"{args.url}/metrics") as response:
+        print("server metrics:", json.load(response))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Seconds of audio processed per second by the silence removal, on the dataset clips concatenated
+# into one long recording. Run from the repository root: python -m benchmarks.silence
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import librosa
+import numpy as np
+import soundfile as sf
+from features import find_audio_files, load_audio
+from silence import remove_silence, remove_silence_file
+
+def split_and_concatenate(audio, top_db=40, frame_length=2048):
+    # Previous implementation in 2_silence_removal.py, with a sensible top_db
+    intervals = librosa.effects.split(audio, top_db=top_db, frame_length=frame_length)
+    return np.concatenate([audio[start:end] for start, end in intervals])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark silence removal on concatenated dataset audio")
+    parser.add_argument('--data', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--minutes', type=float, default=60, help="Length of the concatenated recording")
+    args = parser.parse_args()
+
+    audio_files = find_audio_files(args.data)
+    if not audio_files:
+        raise SystemExit(f"No audio files found under {args.data}")
+    clips = [load_audio(audio_path)[0] for audio_path, _ in audio_files]
+    sr = load_audio(audio_files[0][0])[1]
+
+    # Repeat the dataset until the recording is long enough
+    audio = np.concatenate(clips)
+    repeats = max(1, int(np.ceil(args.minutes * 60 * sr / len(audio))))
+    audio = np.tile(audio, repeats)
+    seconds = len(audio) / sr
+    print(f"{seconds / 60:.1f} minutes of audio at {sr} Hz")
+
+    results = {}
+    for name, function in [('librosa split + concatenate', split_and_concatenate), ('vectorised mask', remove_silence)]:
+        start = time.perf_counter()
+        kept = function(audio)
+        results[name] = (time.perf_counter() - start, len(kept) / len(audio), None)
+
+    # Streaming from disk, tracking the peak memory used while processing
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'long.wav')
+        sf.write(input_path, audio, sr)
+        del audio
+        tracemalloc.start()
+        start = time.perf_counter()
+        total, kept = remove_silence_file(input_path, os.path.join(tmp_dir, 'voiced.wav'), threshold_db=-40.0)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results['streaming from file'] = (elapsed, kept / total, peak)
+
+    print(f"{'method':<30}{'audio s/s':>12}{'kept':>8}{'peak MB':>10}")
+    for name, (elapsed, kept_fraction, peak) in results.items():
+        peak_text = f"{peak / 2**20:.1f}" if peak is not None else '-'
+        print(f"{name:<30}{seconds / elapsed:>12.0f}{kept_fraction:>8.1%}{peak_text:>10}")
+
+if __name__ == '__main__':
+    main()
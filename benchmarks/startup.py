@@ -0,0 +1,94 @@
+# Startup cost of the identification app: import time of the app module against importing the
+# model stack and loading the model up front, as the app did before the background loader, and
+# the wall-clock to the first frame when a display is available.
+# Run from the repository root: python -m benchmarks.startup
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+APP_SCRIPT = '5_birdSpeciesIdentification.py'
+
+# Imports and model load that used to run before the window could appear
+EAGER_CODE = """
+import time
+start = time.perf_counter()
+import tkinter, PIL.ImageTk, audio_cache, pygame
+from inference import BirdPredictor
+BirdPredictor({model!r})
+print(time.perf_counter() - start)
+"""
+
+LAZY_CODE = f"""
+import time
+start = time.perf_counter()
+from benchmarks.common import load_script
+load_script({APP_SCRIPT!r})
+print(time.perf_counter() - start)
+"""
+
+def run_python(code, *options):
+    result = subprocess.run([sys.executable, *options, '-c', code], capture_output=True, text=True, check=True)
+    return result
+
+def import_profile(code, top):
+    # Summary of python -X importtime: total and the slowest top-level imports by cumulative time
+    stderr = run_python(code, '-X', 'importtime').stderr
+    imports = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match and not match.group(3):
+            imports.append((int(match.group(2)) / 1e6, match.group(4)))
+    imports.sort(reverse=True)
+    return sum(seconds for seconds, _ in imports), imports[:top]
+
+def measure_window():
+    # Runs in a fresh interpreter: time to the first drawn frame and until the model is ready
+    start = time.perf_counter()
+    from benchmarks.common import load_script
+    app_module = load_script(APP_SCRIPT)
+    app = app_module.BirdSpeciesDetectionApp()
+    while not app.winfo_viewable():
+        app.update()
+    app.update()
+    first_frame = time.perf_counter() - start
+    while not app.backend.ready.is_set():
+        app.update()
+        time.sleep(0.01)
+    ready = time.perf_counter() - start
+    app.destroy()
+    print(json.dumps({'first_frame': first_frame, 'ready': ready}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the identification app")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--top', type=int, default=8, help="Slowest imports to list")
+    parser.add_argument('--measure-window', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_window:
+        measure_window()
+        return
+
+    eager = float(run_python(EAGER_CODE.format(model=args.model)).stdout.split()[-1])
+    lazy = float(run_python(LAZY_CODE).stdout.split()[-1])
+    print(f"Before the window: {eager:.2f}s with eager imports and model load, {lazy:.2f}s with the background loader")
+
+    for name, code in (('eager', EAGER_CODE.format(model=args.model)), ('lazy', LAZY_CODE)):
+        total, slowest = import_profile(code, args.top)
+        print(f"\n-X importtime, {name}: {total:.2f}s in top-level imports")
+        for seconds, module in slowest:
+            print(f"  {seconds:6.3f}s  {module}")
+
+    if os.name != 'nt' and not os.environ.get('DISPLAY') and sys.platform != 'darwin':
+        print("\nNo display, skipping the time to first frame")
+        return
+    window = json.loads(subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--measure-window'],
+                                       capture_output=True, text=True, check=True).stdout.splitlines()[-1])
+    print(f"\nFirst frame after {window['first_frame']:.2f}s, model ready after {window['ready']:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# Times every pipeline stage on the bundled clips and evaluates the model on the validate split,
+# writing the results to JSON and comparing them against a stored baseline.
+# Run from the repository root: python -m benchmarks.suite --output results.json --baseline baseline.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from alexnet import DEFAULT_FEATURES, build_model
+from benchmarks.common import load_script
+from bird_datasets import BirdAudioDataset
+from evaluation import classification_scores, predict_loader
+from features import compute_features, find_audio_files, load_audio
+from inference import BirdPredictor
+from manifest import build_manifest
+from silence import remove_silence
+
+STAGES = ['split', 'silence', 'spectrogram', 'features', 'dataset', 'train_step', 'inference']
+
+def best_of(repeat, function):
+    # Fastest of several runs, the least disturbed by other work on the machine
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def stage_result(seconds, items):
+    return {'seconds': seconds, 'items': items, 'ms_per_item': seconds * 1000 / max(items, 1)}
+
+def run_stages(args, stages, model_path):
+    audio_files = find_audio_files(args.data)
+    test_files = [path for path, _ in find_audio_files(args.test)]
+    clips = [load_audio(path) for path, _ in audio_files]
+    spectrogram = load_script('3_spectrogram.py')
+    results = {}
+
+    if 'split' in stages:
+        results['split'] = stage_result(best_of(args.repeat, lambda: build_manifest('.', args.data)), len(audio_files))
+
+    if 'silence' in stages:
+        seconds = best_of(args.repeat, lambda: [remove_silence(y) for y, _ in clips])
+        results['silence'] = stage_result(seconds, len(clips))
+
+    if 'spectrogram' in stages:
+        # PNG rendering is slow, a handful of clips is enough
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            subset = clips[:args.spectrograms]
+            render = lambda: [spectrogram.render_spectrogram(y, sr, os.path.join(tmp_dir, f'{i}.png'))
+                              for i, (y, sr) in enumerate(subset)]
+            results['spectrogram'] = stage_result(best_of(args.repeat, render), len(subset))
+
+    if 'features' in stages:
+        compute_features(*clips[0])
+        seconds = best_of(args.repeat, lambda: [compute_features(y, sr, args.features) for y, sr in clips])
+        results['features'] = stage_result(seconds, len(clips))
+
+    if 'dataset' in stages:
+        # Decode and featurise every item, as a DataLoader with no workers would
+        dataset = BirdAudioDataset(args.data, feature_kind=args.features)
+        results['dataset'] = stage_result(best_of(args.repeat, lambda: [dataset[i] for i in range(len(dataset))]), len(dataset))
+
+    if 'train_step' in stages:
+        dataset = BirdAudioDataset(args.data, feature_kind=args.features)
+        samples = [dataset[i] for i in range(min(args.batch_size, len(dataset)))]
+        inputs = torch.stack([x for x, _ in samples])
+        labels = torch.tensor([label for _, label in samples])
+        model = build_model(args.arch, len(dataset.classes))
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+        criterion = nn.CrossEntropyLoss()
+
+        def step():
+            optimizer.zero_grad()
+            criterion(model(inputs), labels).backward()
+            optimizer.step()
+
+        step()
+        results['train_step'] = stage_result(best_of(args.repeat, step), len(samples))
+
+    if 'inference' in stages:
+        predictor = BirdPredictor(model_path)
+        predictor.predict(test_files[0])
+        seconds = best_of(args.repeat, lambda: [predictor.predict(path) for path in test_files])
+        results['inference'] = stage_result(seconds, len(test_files))
+
+    return results
+
+def evaluate(model_path, validate_dir):
+    # Compare by species name, the model's class order may differ from the folder order
+    predictor = BirdPredictor(model_path)
+    dataset = BirdAudioDataset(validate_dir, feature_kind=predictor.feature_kind)
+    truth, predicted = predict_loader(predictor.model, DataLoader(dataset, batch_size=32))
+    return classification_scores([dataset.classes[i] for i in truth], [predictor.classes[i] for i in predicted])
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'threads': torch.get_num_threads(),
+    }
+
+def regressions(results, baseline, tolerance, score_tolerance):
+    # Stages slower than the baseline by more than tolerance, and scores lower by more than score_tolerance.
+    # Differences under 10 ms for the whole stage are timer noise.
+    found = []
+    for name, stage in results['stages'].items():
+        previous = baseline.get('stages', {}).get(name)
+        if (previous and stage['ms_per_item'] > previous['ms_per_item'] * (1 + tolerance)
+                and stage['seconds'] > previous['seconds'] + 0.01):
+            found.append(f"{name}: {stage['ms_per_item']:.1f} ms per item, baseline {previous['ms_per_item']:.1f}")
+    current = results.get('evaluation') or {}
+    previous = baseline.get('evaluation') or {}
+    for metric in ('accuracy', 'macro_f1'):
+        if current.get(metric) is not None and previous.get(metric) is not None and current[metric] < previous[metric] - score_tolerance:
+            found.append(f"{metric}: {current[metric]:.3f}, baseline {previous[metric]:.3f}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and evaluate the model")
+    parser.add_argument('--data', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--test', default='test', help="Clips used for the inference timing")
+    parser.add_argument('--validate', default='validate', help="Split used for accuracy and F1")
+    parser.add_argument('--model', default='alexnet.pth', help="Trained model, evaluation is skipped without it")
+    parser.add_argument('--arch', default='alexnet', help="Architecture used for the training step and when there is no model")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=16, help="Batch size of the training step")
+    parser.add_argument('--spectrograms', type=int, default=5, help="Clips rendered to PNG")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="Results of an earlier run to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slow-down per stage, as a fraction")
+    parser.add_argument('--score-tolerance', type=float, default=0.02, help="Allowed drop in accuracy and macro F1")
+    args = parser.parse_args()
+    args.features = DEFAULT_FEATURES[args.arch]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Timings don't need a trained model, an untrained one of the same architecture will do
+        model_path = args.model
+        if not os.path.exists(model_path):
+            classes = sorted(species for species in os.listdir(args.data) if os.path.isdir(os.path.join(args.data, species)))
+            model_path = os.path.join(tmp_dir, 'untrained.pth')
+            torch.save({'state_dict': build_model(args.arch, len(classes)).state_dict(), 'arch': args.arch,
+                        'classes': classes, 'features': args.features}, model_path)
+        results = {'environment': environment(), 'stages': run_stages(args, args.stages, model_path)}
+    results['evaluation'] = evaluate(args.model, args.validate) if os.path.exists(args.model) else None
+
+    print(f"{'stage':<14}{'items':>7}{'seconds':>10}{'ms/item':>10}")
+    for name, stage in results['stages'].items():
+        print(f"{name:<14}{stage['items']:>7}{stage['seconds']:>10.2f}{stage['ms_per_item']:>10.1f}")
+    if results['evaluation']:
+        scores = results['evaluation']
+        print(f"Validation: accuracy {scores['accuracy']:.1%}, macro F1 {scores['macro_f1']:.3f} on {scores['samples']} samples")
+    else:
+        print(f"No model at {args.model}, skipping the evaluation")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance, args.score_tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import json
+import os
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+from PIL import Image
+from alexnet import list_classes
+from features import AUDIO_EXTENSIONS, audio_features
+from instrumentation import timed
+from manifest import manifest_files, read_manifest
+
+# Preprocess spectrogram images rendered by 3_spectrogram.py
+image_transform = transforms.Compose([
+    transforms.Grayscale(num_output_channels=1),
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.5], std=[0.5]),
+])
+
+# Custom dataset class to load images
+class BirdImageDataset(Dataset):
+    def __init__(self, root_dir, transform=None):
+        self.root_dir = root_dir
+        self.transform = transform
+        self.classes = list_classes(root_dir)
+        self.images = []
+        self.labels = []
+        for label, bird in enumerate(self.classes):
+            bird_folder = os.path.join(root_dir, bird)
+            image_files = [os.path.join(bird_folder, f) for f in os.listdir(bird_folder) if f.endswith('.png')]
+            self.images.extend(image_files)
+            self.labels.extend([label] * len(image_files))
+            print(f"Processed {len(image_files)} images from {bird_folder}")
+
+    def __len__(self):
+        return len(self.images)
+
+    @timed('dataset.image_item')
+    def __getitem__(self, idx):
+        img_path = self.images[idx]
+        image = Image.open(img_path)
+        label = self.labels[idx]
+        if self.transform:
+            image = self.transform(image)
+        return image, label
+
+# Dataset that computes the spectrogram features directly from the audio files, found either
+# in <root_dir>/<species>/ folders or in one split of the manifest written by 1_Division_of_dataset.py;
+# verbose=False keeps it quiet, e.g. on all but the first process of a distributed run
+class BirdAudioDataset(Dataset):
+    def __init__(self, root_dir=None, feature_kind='stft', transform=None, manifest=None, split=None, verbose=True):
+        self.root_dir = root_dir
+        self.feature_kind = feature_kind
+        self.transform = transform
+        self.audio_files = []
+        self.labels = []
+        if manifest:
+            # Labels come from all species in the manifest, so they match across splits
+            self.classes = sorted({row['species'] for row in read_manifest(manifest)})
+            label_of = {bird: label for label, bird in enumerate(self.classes)}
+            for audio_path, species in manifest_files(manifest, split):
+                self.audio_files.append(audio_path)
+                self.labels.append(label_of[species])
+            if verbose:
+                print(f"Found {len(self.audio_files)} {split or 'all'} recordings in {manifest}")
+            return
+
+        self.classes = list_classes(root_dir)
+        for label, bird in enumerate(self.classes):
+            bird_folder = os.path.join(root_dir, bird)
+            audio_files = [os.path.join(bird_folder, f) for f in sorted(os.listdir(bird_folder)) if f.lower().endswith(AUDIO_EXTENSIONS)]
+            self.audio_files.extend(audio_files)
+            self.labels.extend([label] * len(audio_files))
+            if verbose:
+                print(f"Found {len(audio_files)} recordings in {bird_folder}")
+
+    def __len__(self):
+        return len(self.audio_files)
+
+    @timed('dataset.audio_item')
+    def __getitem__(self, idx):
+        features = audio_features(self.audio_files[idx], self.feature_kind)
+        label = self.labels[idx]
+        if self.transform:
+            features = self.transform(features)
+        return features, label
+
+def pack_dataset(dataset, store_path, batch_size=32, workers=0):
+    # Write every preprocessed sample into one memory-mapped .npy file plus a JSON index
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    sample, _ = dataset[0]
+    features = np.lib.format.open_memmap(store_path + '.npy', mode='w+', dtype=np.float32,
+                                         shape=(len(dataset),) + tuple(sample.shape))
+
+    # Samples are written in dataset order, so the index can reuse the dataset's labels
+    loader = DataLoader(dataset, batch_size=batch_size, num_workers=workers)
+    offset = 0
+    for inputs, _ in loader:
+        features[offset:offset + len(inputs)] = inputs.numpy()
+        offset += len(inputs)
+    features.flush()
+    del features
+
+    index = {
+        'classes': dataset.classes,
+        'labels': list(dataset.labels),
+        'paths': list(getattr(dataset, 'audio_files', getattr(dataset, 'images', []))),
+        'features': getattr(dataset, 'feature_kind', 'stft'),
+    }
+    with open(store_path + '.json', 'w') as f:
+        json.dump(index, f)
+
+# Dataset serving samples packed by pack_dataset as views of the memory-mapped file
+class PackedBirdDataset(Dataset):
+    def __init__(self, store_path):
+        self.store_path = store_path
+        with open(store_path + '.json') as f:
+            index = json.load(f)
+        self.classes = index['classes']
+        self.labels = index['labels']
+        self.paths = index['paths']
+        self.feature_kind = index['features']
+        # Opened lazily so every DataLoader worker maps the file itself instead of pickling it
+        self.features = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    @timed('dataset.packed_item')
+    def __getitem__(self, idx):
+        if self.features is None:
+            # Copy-on-write mapping: writable for torch.from_numpy, but pages are only read from disk
+            self.features = np.load(self.store_path + '.npy', mmap_mode='c')
+        return torch.from_numpy(self.features[idx]), self.labels[idx]
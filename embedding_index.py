@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+from alexnet import load_model
+from bird_datasets import BirdAudioDataset
+from features import audio_features
+
+def embedding_network(model):
+    # The classifier without its output layer: AlexNet's 4096-d penultimate activations, or the
+    # 256-d pooled features of the compact network
+    if isinstance(model, torch.jit.ScriptModule):
+        raise ValueError("Embeddings need the float checkpoint from 4_alexnet.py, not a TorchScript export")
+    return nn.Sequential(model.features, model.avgpool, nn.Flatten(1), *list(model.classifier)[:-1]).eval()
+
+def normalise(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def fit_pca(embeddings, dim, sample_size=10000, seed=42):
+    # Principal components from at most sample_size rows, enough for a stable projection
+    rng = np.random.default_rng(seed)
+    sample = embeddings[rng.choice(len(embeddings), min(sample_size, len(embeddings)), replace=False)].astype(np.float64)
+    mean = sample.mean(axis=0)
+    _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+    return mean.astype(np.float32), vt[:dim].T.astype(np.float32)
+
+def kmeans(vectors, n_lists, iterations=10, sample_size=20000, seed=42):
+    # Spherical k-means on a sample: centroids are re-normalised means of their unit vectors
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(n_lists):
+            members = sample[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = normalise(centroids)
+    return centroids
+
+# Unit-length embeddings in one matrix, searched by cosine similarity. Stored like the packed feature
+# store: <path>.npy with the matrix (float16 or float32) and <path>.json with the recordings, plus
+# <path>.npz with the PCA projection and the inverted-file lists when they are used. Searches run on
+# a float32 copy, float16 only halves the file.
+class EmbeddingIndex:
+    def __init__(self, vectors, paths, species, info, mean=None, components=None, centroids=None, offsets=None):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.paths = paths
+        self.species = species
+        self.info = info
+        self.mean = mean
+        self.components = components
+        self.centroids = centroids
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, embeddings, paths, species, info, dim=256, n_lists=0):
+        mean = components = centroids = offsets = None
+        if dim and dim < embeddings.shape[1]:
+            mean, components = fit_pca(embeddings, dim)
+            embeddings = (embeddings - mean) @ components
+        vectors = normalise(embeddings.astype(np.float32))
+
+        if n_lists:
+            # Inverted file: rows sorted by their nearest centroid, offsets[i]:offsets[i + 1] is list i
+            centroids = kmeans(vectors, min(n_lists, len(vectors)))
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind='stable')
+            vectors = vectors[order]
+            paths = [paths[i] for i in order]
+            species = [species[i] for i in order]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+        return cls(vectors, list(paths), list(species), info, mean, components, centroids, offsets)
+
+    def save(self, index_path, dtype='float16'):
+        os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+        np.save(index_path + '.npy', self.vectors.astype(dtype))
+        extra = {name: value for name, value in [('mean', self.mean), ('components', self.components),
+                                                 ('centroids', self.centroids), ('offsets', self.offsets)] if value is not None}
+        if extra:
+            np.savez(index_path + '.npz', **extra)
+        elif os.path.exists(index_path + '.npz'):
+            # An earlier build into the same path had a projection or lists that no longer apply
+            os.remove(index_path + '.npz')
+        with open(index_path + '.json', 'w') as f:
+            json.dump({**self.info, 'paths': self.paths, 'species': self.species}, f)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path + '.json') as f:
+            info = json.load(f)
+        paths = info.pop('paths')
+        species = info.pop('species')
+        extra = dict(np.load(index_path + '.npz')) if os.path.exists(index_path + '.npz') else {}
+        return cls(np.load(index_path + '.npy'), paths, species, info, **extra)
+
+    def project(self, embeddings):
+        # Raw model embeddings to the unit vectors stored in the index
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.components is not None:
+            embeddings = (embeddings - self.mean) @ self.components
+        return normalise(embeddings)
+
+    def search(self, embedding, k=5, n_probe=8):
+        # Top-k (row, similarity) pairs for one raw embedding; with an inverted file only the
+        # n_probe lists whose centroids are closest to the query are scanned
+        query = self.project(embedding)[0]
+        if self.centroids is None:
+            rows = np.arange(len(self.vectors))
+            scores = self.vectors @ query
+        else:
+            lists = np.argsort(-(self.centroids @ query))[:n_probe]
+            rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+            scores = self.vectors[rows] @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+def compute_embeddings(network, dataset, batch_size=32, workers=0):
+    batches = []
+    with torch.inference_mode():
+        for inputs, _ in DataLoader(dataset, batch_size=batch_size, num_workers=workers):
+            batches.append(network(inputs).numpy())
+    return np.concatenate(batches)
+
+def index_model_changed(info):
+    # The checkpoint was retrained or replaced since the index was built, so its embeddings no longer
+    # compare with the stored ones; indexes from before the mtime was recorded count as changed
+    model_path = info['model']
+    return not os.path.exists(model_path) or os.path.getmtime(model_path) != info.get('model_mtime')
+
+# Nearest reference recordings for model inputs, with the float model the index was built from.
+# A model already loaded from model_path, e.g. by a BirdPredictor, is reused when it is that checkpoint.
+class SimilaritySearch:
+    def __init__(self, index_path, model=None, model_path=None):
+        self.index = EmbeddingIndex.load(index_path)
+        index_model = self.index.info['model']
+        if index_model_changed(self.index.info):
+            raise ValueError(f"{index_model} changed since {index_path} was built, rebuild it with embedding_index.py build")
+        if model is None or model_path is None or os.path.abspath(model_path) != index_model:
+            model, _ = load_model(index_model)
+        self.network = embedding_network(model)
+        self.feature_kind = self.index.info['features']
+
+    def neighbours(self, inputs, k=5):
+        # inputs is one (1, size, size) model input, as in BirdPredictor.predict's 'spectrogram'
+        with torch.inference_mode():
+            embedding = self.network(inputs.unsqueeze(0)).numpy()
+        return [{'path': self.index.paths[row], 'species': self.index.species[row], 'similarity': similarity}
+                for row, similarity in self.index.search(embedding, k)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query an index of recording embeddings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="Embed every recording under --input")
+    build.add_argument('--model', default='alexnet.pth', help="Float checkpoint from 4_alexnet.py")
+    build.add_argument('--input', default='dataset', help="Folder with <species>/<audio> files")
+    build.add_argument('--output', default='index/dataset', help="Index path, written as <output>.npy/.json/.npz")
+    build.add_argument('--dim', type=int, default=256, help="PCA dimensions, 0 keeps the full embedding")
+    build.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+    build.add_argument('--lists', type=int, default=0, help="Inverted-file lists for large collections, 0 for exact search")
+    build.add_argument('--workers', type=int, default=4)
+    query = subparsers.add_parser('query', help="Closest indexed recordings to audio files")
+    query.add_argument('audio', nargs='+')
+    query.add_argument('--index', default='index/dataset')
+    query.add_argument('-k', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        model, info = load_model(args.model)
+        dataset = BirdAudioDataset(args.input, feature_kind=info['features'])
+        embeddings = compute_embeddings(embedding_network(model), dataset, workers=args.workers)
+        species = [dataset.classes[label] for label in dataset.labels]
+        index = EmbeddingIndex.build(embeddings, dataset.audio_files, species,
+                                     {'model': os.path.abspath(args.model), 'model_mtime': os.path.getmtime(args.model),
+                                      'features': info['features']}, args.dim, args.lists)
+        index.save(args.output, args.dtype)
+        print(f"Indexed {len(index.paths)} recordings as {index.vectors.shape[1]}-d {args.dtype} vectors in {args.output}.npy")
+    else:
+        try:
+            search = SimilaritySearch(args.index)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        for audio_path in args.audio:
+            print(audio_path)
+            for neighbour in search.neighbours(audio_features(audio_path, search.feature_kind), args.k):
+                print(f"  {neighbour['similarity']:.3f}  {neighbour['species']:<16}{neighbour['path']}")
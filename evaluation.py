@@ -0,0 +1,23 @@
+import torch
+from sklearn.metrics import accuracy_score, f1_score
+
+def predict_loader(model, loader):
+    # True and predicted class indices for every sample of a DataLoader
+    model.eval()
+    truth = []
+    predicted = []
+    with torch.inference_mode():
+        for inputs, labels in loader:
+            predicted += model(inputs).argmax(dim=1).tolist()
+            truth += labels.tolist()
+    return truth, predicted
+
+def classification_scores(truth, predicted):
+    # Accuracy and macro-averaged F1, so rare species count as much as common ones
+    if not truth:
+        return {'samples': 0, 'accuracy': None, 'macro_f1': None}
+    return {
+        'samples': len(truth),
+        'accuracy': accuracy_score(truth, predicted),
+        'macro_f1': f1_score(truth, predicted, average='macro', zero_division=0),
+    }
@@ -0,0 +1,33 @@
+import argparse
+import json
+import os
+import torch
+import torch.nn as nn
+from alexnet import load_model
+from features import IMAGE_SIZE
+
+def export_model(model_path, output_path, quantize=True):
+    model, info = load_model(model_path)
+
+    # Dynamic int8 quantization of the fully connected layers, which hold almost all of the weights
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    # Trace to TorchScript so the model loads without the Python class or load_state_dict
+    example = torch.zeros(1, 1, IMAGE_SIZE, IMAGE_SIZE)
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, example)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, output_path, _extra_files={'info.json': json.dumps(info)})
+    return info
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the trained model as (quantized) TorchScript")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--output', default='alexnet_int8.pt')
+    parser.add_argument('--no-quantize', action='store_true', help="Export the float model without quantization")
+    args = parser.parse_args()
+
+    export_model(args.model, args.output, quantize=not args.no_quantize)
+    print(f"Exported {args.model} ({os.path.getsize(args.model) / 2**20:.1f} MB) "
+          f"to {args.output} ({os.path.getsize(args.output) / 2**20:.1f} MB)")
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import librosa
+import torch
+import torch.nn.functional as F
+import audio_cache
+from instrumentation import timed, timer
+
+# librosa.load resamples to this rate by default, as in 3_spectrogram.py
+SAMPLE_RATE = 22050
+
+# Input size of the AlexNet model
+IMAGE_SIZE = 224
+
+# Number of mel bands for the log-mel features
+N_MELS = 128
+
+FEATURE_KINDS = ('stft', 'mel')
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg')
+
+def find_audio_files(root_dir):
+    # List (path, species) pairs for a <root_dir>/<species>/<file> tree
+    audio_files = []
+    for species in sorted(os.listdir(root_dir)):
+        species_folder = os.path.join(root_dir, species)
+        if not os.path.isdir(species_folder):
+            continue
+        for f in sorted(os.listdir(species_folder)):
+            if f.lower().endswith(AUDIO_EXTENSIONS):
+                audio_files.append((os.path.join(species_folder, f), species))
+    return audio_files
+
+@timed('audio.load')
+def load_audio(audio_path, sr=SAMPLE_RATE):
+    # Decode the audio file to a mono float32 signal, through the decoded audio cache
+    return audio_cache.default_cache().load(audio_path, sr)
+
+def log_spectrogram(y):
+    # Same quantity 3_spectrogram.py plots: STFT magnitude in dB relative to the peak
+    with timer('features.stft'):
+        S = np.abs(librosa.stft(y))
+    with timer('features.amplitude_to_db'):
+        return librosa.amplitude_to_db(S, ref=np.max)
+
+@timed('features.mel')
+def log_mel_spectrogram(y, sr=SAMPLE_RATE, n_mels=N_MELS):
+    # Mel power spectrogram in dB relative to the peak
+    S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+    return librosa.power_to_db(S, ref=np.max)
+
+@timed('features.to_tensor')
+def spectrogram_to_tensor(D, size=IMAGE_SIZE):
+    # Both dB conversions clip at 80 dB below the peak, map [-80, 0] dB to [0, 1]
+    image = (np.clip(D, -80.0, 0.0) + 80.0) / 80.0
+
+    # Put low frequencies at the bottom row, as in the rendered spectrogram
+    image = np.ascontiguousarray(image[::-1], dtype=np.float32)
+
+    # Resize to the model input size
+    tensor = torch.from_numpy(image)[None, None]
+    tensor = F.interpolate(tensor, size=(size, size), mode='bilinear', align_corners=False)
+
+    # Same normalisation as the image training transform
+    return (tensor[0] - 0.5) / 0.5
+
+def compute_features(y, sr=SAMPLE_RATE, kind='stft', size=IMAGE_SIZE):
+    # Model input (1 x size x size float32 tensor) straight from the waveform
+    if kind == 'stft':
+        D = log_spectrogram(y)
+    elif kind == 'mel':
+        D = log_mel_spectrogram(y, sr)
+    else:
+        raise ValueError(f"Unknown feature kind {kind!r}, expected one of {FEATURE_KINDS}")
+    return spectrogram_to_tensor(D, size)
+
+def audio_features(audio_path, kind='stft', size=IMAGE_SIZE):
+    # Decode and featurise one audio file
+    y, sr = load_audio(audio_path)
+    return compute_features(y, sr, kind, size)
+
+def tensor_to_image(tensor):
+    # Undo the normalisation to get an 8-bit grayscale array for display
+    image = (tensor[0] * 0.5 + 0.5).clamp(0, 1) * 255
+    return image.to(torch.uint8).numpy()
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+import torch
+from features import AUDIO_EXTENSIONS, audio_features
+from inference import BirdPredictor
+
+def find_inputs(patterns):
+    # Audio files under the given folders (recursively) or matching the given glob patterns
+    audio_files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for folder, _, files in os.walk(pattern):
+                audio_files += [os.path.join(folder, f) for f in files if f.lower().endswith(AUDIO_EXTENSIONS)]
+        else:
+            audio_files += [f for f in glob.glob(pattern, recursive=True) if f.lower().endswith(AUDIO_EXTENSIONS)]
+    return sorted({os.path.normpath(f) for f in audio_files})
+
+def ground_truth(audio_path, classes):
+    # The parent folder is the label when it names one of the model's classes, as in test/<species>/
+    species = os.path.basename(os.path.dirname(os.path.abspath(audio_path)))
+    return species if species in classes else ''
+
+def init_worker():
+    # One thread per worker process, the pool already keeps every core busy
+    torch.set_num_threads(1)
+
+def featurise(job):
+    audio_path, feature_kind = job
+    try:
+        return audio_path, audio_features(audio_path, feature_kind).numpy(), None
+    except Exception as e:
+        return audio_path, None, str(e)
+
+def fieldnames(top_k):
+    fields = ['file', 'label']
+    for rank in range(1, top_k + 1):
+        fields += [f'species_{rank}', f'confidence_{rank}']
+    return fields
+
+def read_rows(path):
+    if not os.path.exists(path):
+        return []
+    if path.endswith('.parquet'):
+        import pandas as pd
+        return pd.read_parquet(path).fillna('').astype(str).to_dict('records')
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def write_parquet(rows, path, fields):
+    try:
+        import pandas as pd
+    except ImportError:
+        sys.exit("Writing Parquet needs pandas and pyarrow: pip install pandas pyarrow")
+    frame = pd.DataFrame(rows, columns=fields)
+    for column in fields:
+        if column.startswith('confidence_'):
+            frame[column] = pd.to_numeric(frame[column])
+    frame.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+def identify(predictor, audio_files, output, top_k=3, batch_size=32, workers=4):
+    # Results are appended to a CSV file batch by batch, so an interrupted run can pick up where it
+    # stopped. Parquet output is written from that file once every input has been processed.
+    parquet = output.endswith('.parquet')
+    journal = output + '.partial.csv' if parquet else output
+    fields = fieldnames(top_k)
+    done = {row['file'] for row in read_rows(output) + (read_rows(journal) if parquet else [])}
+    todo = [path for path in audio_files if path not in done]
+
+    new_journal = not os.path.exists(journal) or os.path.getsize(journal) == 0
+    failed = 0
+    start = time.perf_counter()
+    with open(journal, 'a', newline='') as f, Pool(workers, initializer=init_worker) as pool:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        if new_journal:
+            writer.writeheader()
+
+        def flush(batch):
+            probabilities = predictor.predict_features(torch.from_numpy(np.stack([x for _, x in batch])))
+            for (audio_path, _), p in zip(batch, probabilities):
+                row = {'file': audio_path, 'label': ground_truth(audio_path, predictor.classes)}
+                for rank, (species, confidence) in enumerate(predictor.top_predictions(p, top_k), 1):
+                    row[f'species_{rank}'] = species
+                    row[f'confidence_{rank}'] = f'{confidence:.4f}'
+                writer.writerow(row)
+            f.flush()
+
+        # Decoding and featurising run in the pool, the model sees full batches in this process
+        batch = []
+        jobs = [(path, predictor.feature_kind) for path in todo]
+        for audio_path, inputs, error in pool.imap_unordered(featurise, jobs, chunksize=4):
+            if error:
+                failed += 1
+                print(f"Skipping {audio_path}: {error}", file=sys.stderr)
+                continue
+            batch.append((audio_path, inputs))
+            if len(batch) == batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    elapsed = time.perf_counter() - start
+
+    if parquet:
+        write_parquet(read_rows(output) + read_rows(journal), output, fields)
+        os.remove(journal)
+    return len(todo) - failed, len(done), failed, elapsed
+
+def print_confusion_matrix(rows, classes):
+    # Only rows whose folder names a class have a ground truth
+    from sklearn.metrics import confusion_matrix
+    labelled = [row for row in rows if row['label']]
+    if not labelled:
+        return
+    truth = [row['label'] for row in labelled]
+    predicted = [row['species_1'] for row in labelled]
+    matrix = confusion_matrix(truth, predicted, labels=classes)
+    accuracy = sum(t == p for t, p in zip(truth, predicted)) / len(labelled)
+
+    width = max(len(c) for c in classes) + 2
+    print(f"\nConfusion matrix over {len(labelled)} labelled files (rows: truth, columns: predicted), accuracy {accuracy:.1%}")
+    print(' ' * width + ''.join(f"{c[:width - 2]:>{width}}" for c in classes))
+    for species, counts in zip(classes, matrix):
+        print(f"{species:<{width}}" + ''.join(f"{count:>{width}}" for count in counts))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Identify the bird species of many audio files")
+    parser.add_argument('inputs', nargs='+', help="Folders (searched recursively) or glob patterns, e.g. test/ or 'recordings/**/*.wav'")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--output', default='predictions.csv', help="Results file, .csv or .parquet")
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes decoding and featurising")
+    args = parser.parse_args()
+
+    predictor = BirdPredictor(args.model)
+    audio_files = find_inputs(args.inputs)
+    processed, skipped, failed, elapsed = identify(predictor, audio_files, args.output, args.top_k, args.batch_size, args.workers)
+    print(f"{processed} files in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} files/s), "
+          f"{skipped} already in {args.output}, {failed} failed")
+
+    inputs = set(audio_files)
+    print_confusion_matrix([row for row in read_rows(args.output) if row['file'] in inputs], predictor.classes)
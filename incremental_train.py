@@ -0,0 +1,179 @@
+import argparse
+import hashlib
+import os
+import random
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Dataset
+from alexnet import is_torchscript, load_model
+from evaluation import classification_scores, predict_loader
+from features import audio_features
+from manifest import build_manifest, read_manifest, write_manifest
+
+# Model inputs of every recording, one .npy file per (path, size, mtime, feature kind), so unchanged
+# recordings are featurised once and changed ones get a new entry
+class FeatureCache(Dataset):
+    def __init__(self, cache_dir, base_dir, rows, labels, feature_kind):
+        self.cache_dir = cache_dir
+        self.base_dir = base_dir
+        self.rows = rows
+        self.labels = labels
+        self.feature_kind = feature_kind
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def path(self, row):
+        key = f"{row['path']}/{row['size']}/{row['mtime']}/{self.feature_kind}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+    def __getitem__(self, idx):
+        row = self.rows[idx]
+        cache_path = self.path(row)
+        try:
+            features = torch.from_numpy(np.load(cache_path))
+        except (FileNotFoundError, ValueError, OSError):
+            features = audio_features(os.path.join(self.base_dir, *row['path'].split('/')), self.feature_kind)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.save(f, features.numpy())
+            os.replace(temp_path, cache_path)
+        return features, self.labels[idx]
+
+def changed_rows(rows, trained_rows):
+    # Recordings that are new or whose size or modification time changed since the last training
+    trained = {row['path']: (row['size'], row['mtime']) for row in trained_rows}
+    return [row for row in rows if trained.get(row['path']) != (row['size'], row['mtime'])]
+
+def expand_classifier(model, old_classes, classes):
+    # Replace the output layer with one for the new class list; known species keep their weights,
+    # new species start from a fresh initialisation
+    old_layer = model.classifier[-1]
+    new_layer = nn.Linear(old_layer.in_features, len(classes))
+    with torch.no_grad():
+        for i, species in enumerate(classes):
+            if species in old_classes:
+                j = old_classes.index(species)
+                new_layer.weight[i] = old_layer.weight[j]
+                new_layer.bias[i] = old_layer.bias[j]
+    model.classifier[-1] = new_layer
+
+def fine_tune(model, loader, epochs, lr, train_features):
+    # The feature extractor stays frozen unless train_features is set; only the classifier learns
+    for parameter in model.features.parameters():
+        parameter.requires_grad = train_features
+    optimizer = optim.Adam([p for p in model.parameters() if p.requires_grad], lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    for epoch in range(epochs):
+        model.train()
+        if not train_features:
+            # Keep batch-norm statistics of the frozen layers as they were
+            model.features.eval()
+        running_loss = 0.0
+        samples = 0
+        for inputs, labels in loader:
+            optimizer.zero_grad()
+            loss = criterion(model(inputs), labels)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * inputs.size(0)
+            samples += inputs.size(0)
+        print(f"Epoch [{epoch+1}/{epochs}], Train Loss: {running_loss / max(samples, 1):.4f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune the classifier on recordings added since the last training")
+    parser.add_argument('--base-dir', default='C:\\BSD', help="Folder holding dataset/ and manifest.csv")
+    parser.add_argument('--model', default='alexnet.pth', help="Checkpoint from 4_alexnet.py or an earlier incremental run")
+    parser.add_argument('--output', help="Updated checkpoint (default: overwrite --model)")
+    parser.add_argument('--cache', default=os.path.join('features', 'cache'), help="Per-recording feature cache")
+    parser.add_argument('--replay', type=float, default=1.0, help="Previously trained recordings replayed per new one")
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--lr', type=float, default=0.0001)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument('--train-features', action='store_true', help="Fine-tune the convolutional layers as well")
+    parser.add_argument('--full-epochs', type=int, default=10, help="Epochs of a full retraining, for the time comparison")
+    parser.add_argument('--baseline-manifest', help="Manifest the model was trained on (default: <model>.manifest.csv)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    output = args.output or args.model
+    run_start = time.perf_counter()
+
+    # The output layer is replaced and the feature extractor frozen, which needs the float checkpoint
+    if is_torchscript(args.model):
+        raise SystemExit(f"{args.model} is a TorchScript export, fine-tune the float checkpoint from 4_alexnet.py instead")
+
+    # Without the manifest the model was trained on, every recording would count as new
+    baseline_manifest = args.baseline_manifest or args.model + '.manifest.csv'
+    if not os.path.exists(baseline_manifest):
+        raise SystemExit(f"{baseline_manifest} not found: train with 4_alexnet.py --manifest first, "
+                         f"or pass the manifest the model was trained on with --baseline-manifest")
+
+    # Bring the manifest up to date; recordings keep their split, as with 1_Division_of_dataset.py --mode none
+    manifest_path = os.path.join(args.base_dir, 'manifest.csv')
+    rows = build_manifest(args.base_dir, os.path.join(args.base_dir, 'dataset'), read_manifest(manifest_path))
+    write_manifest(manifest_path, rows)
+
+    # The manifest the model was last trained on is kept next to it
+    trained_rows = read_manifest(baseline_manifest)
+    new_rows = changed_rows(rows, trained_rows)
+    new_train = [row for row in new_rows if row['split'] == 'train']
+    print(f"{len(new_rows)} new or changed recordings since the last training, {len(new_train)} of them in the train split")
+    if not new_train:
+        print("Nothing new to train on, the model is unchanged")
+        raise SystemExit
+
+    model, info = load_model(args.model)
+    old_classes = info['classes']
+    classes = sorted({row['species'] for row in rows})
+    added = [species for species in classes if species not in old_classes]
+    if added or classes != old_classes:
+        expand_classifier(model, old_classes, classes)
+        print(f"New species: {', '.join(added)}" if added else "Class order changed, output layer remapped")
+    label_of = {species: label for label, species in enumerate(classes)}
+
+    # New recordings plus a random sample of the ones trained on before, so earlier species aren't forgotten
+    new_paths = {row['path'] for row in new_train}
+    old_train = [row for row in rows if row['split'] == 'train' and row['path'] not in new_paths]
+    replay = random.Random(args.seed).sample(old_train, min(len(old_train), int(args.replay * len(new_train))))
+    train_rows = new_train + replay
+
+    # Featurise the new recordings first, so the time can be compared with a full pass
+    feature_start = time.perf_counter()
+    new_set = FeatureCache(args.cache, args.base_dir, new_train, [label_of[row['species']] for row in new_train], info['features'])
+    for _ in DataLoader(new_set, batch_size=args.batch_size, num_workers=args.workers):
+        pass
+    feature_time = time.perf_counter() - feature_start
+
+    train_set = FeatureCache(args.cache, args.base_dir, train_rows, [label_of[row['species']] for row in train_rows], info['features'])
+    train_start = time.perf_counter()
+    fine_tune(model, DataLoader(train_set, batch_size=args.batch_size, shuffle=True, num_workers=args.workers),
+              args.epochs, args.lr, args.train_features)
+    train_time = time.perf_counter() - train_start
+
+    val_rows = [row for row in rows if row['split'] == 'validate']
+    val_set = FeatureCache(args.cache, args.base_dir, val_rows, [label_of[row['species']] for row in val_rows], info['features'])
+    scores = classification_scores(*predict_loader(model, DataLoader(val_set, batch_size=args.batch_size, num_workers=args.workers)))
+    if scores['samples']:
+        print(f"Validation: accuracy {scores['accuracy']:.1%}, macro F1 {scores['macro_f1']:.3f} on {scores['samples']} samples")
+
+    torch.save({'state_dict': model.state_dict(), 'arch': info['arch'], 'classes': classes, 'features': info['features']}, output)
+    write_manifest(output + '.manifest.csv', rows)
+    # An export of the previous model is now stale, the app falls back to the checkpoint until it is redone
+    export_path = os.path.splitext(output)[0] + '_int8.pt'
+    if os.path.exists(export_path):
+        print(f"{export_path} was exported from the previous model, update it with: "
+              f"python export_model.py --model {output} --output {export_path}")
+    total_time = time.perf_counter() - run_start
+
+    # A full retraining featurises every train recording and trains all layers for --full-epochs epochs;
+    # estimated from this run's per-recording costs, which understates it when the features were frozen here
+    all_train = sum(1 for row in rows if row['split'] == 'train')
+    full_time = (feature_time / len(new_train) + train_time / (args.epochs * len(train_rows)) * args.full_epochs) * all_train
+    print(f"Incremental update took {total_time:.1f}s ({feature_time:.1f}s featurising {len(new_train)} recordings, "
+          f"{train_time:.1f}s training on {len(train_rows)}); a full retraining of {all_train} recordings for "
+          f"{args.full_epochs} epochs would take at least {full_time:.1f}s, saving {full_time - total_time:.1f}s")
@@ -0,0 +1,64 @@
+import time
+import torch
+from alexnet import load_model
+from features import compute_features, load_audio
+from instrumentation import timed
+from torch_features import FeatureModel, SpectrogramFrontEnd, pad_batch
+
+class BirdPredictor:
+    def __init__(self, model_path='alexnet.pth', classes=None):
+        # Load the trained model once and reuse it for every request
+        self.model, info = load_model(model_path, classes)
+        self.classes = info['classes']
+        self.feature_kind = info['features']
+        self.waveform_model = None
+
+    @timed('predict')
+    def predict(self, audio_path, top_k=3):
+        start = time.perf_counter()
+
+        # Decode the uploaded audio
+        y, sr = load_audio(audio_path)
+        decoded = time.perf_counter()
+
+        # Compute the spectrogram tensor in memory
+        inputs = compute_features(y, sr, self.feature_kind)
+        featurised = time.perf_counter()
+
+        # Run the model
+        probabilities = self.predict_features(inputs.unsqueeze(0))[0]
+        finished = time.perf_counter()
+
+        return {
+            'predictions': self.top_predictions(probabilities, top_k),
+            'spectrogram': inputs,
+            'timings': {
+                'decode': decoded - start,
+                'feature': featurised - decoded,
+                'forward': finished - featurised,
+            },
+        }
+
+    @timed('model.forward')
+    def predict_features(self, inputs):
+        # Class probabilities for a batch of model inputs
+        with torch.inference_mode():
+            return torch.softmax(self.model(inputs), dim=1)
+
+    @timed('model.waveform_forward')
+    def predict_waveforms(self, waveforms):
+        # Class probabilities for a list of waveforms at SAMPLE_RATE, with the batched torch
+        # front-end as the model's first layer instead of featurising each clip with librosa
+        if self.waveform_model is None:
+            self.waveform_model = FeatureModel(SpectrogramFrontEnd(self.feature_kind), self.model).eval()
+        with torch.inference_mode():
+            return torch.softmax(self.waveform_model(*pad_batch(waveforms)), dim=1)
+
+    def top_predictions(self, probabilities, top_k=3):
+        # Keep the k most likely species of one sample as (species, probability) pairs
+        top = torch.topk(probabilities, min(top_k, len(self.classes)))
+        return [(self.classes[i], p) for p, i in zip(top.values.tolist(), top.indices.tolist())]
+
+def display_name(species):
+    # Folder names use underscores, e.g. laughing_dove -> Laughing Dove
+    return species.replace("_", " ").title()
@@ -0,0 +1,168 @@
+import atexit
+import cProfile
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+# Switched on with BIRD_INSTRUMENT=1. BIRD_PROFILE_STAGE=<stage> additionally runs a profiler
+# around that stage (BIRD_PROFILER=cprofile or torch), after skipping its first BIRD_PROFILE_SKIP
+# calls, and implies BIRD_INSTRUMENT. Stats are printed to stderr at exit and written as JSON to
+# BIRD_INSTRUMENT_OUTPUT if set. Worker processes of multiprocessing pools and DataLoaders exit
+# without running exit handlers, so only stages run in the main process are reported.
+PROFILE_STAGE = os.environ.get('BIRD_PROFILE_STAGE')
+PROFILER = os.environ.get('BIRD_PROFILER', 'cprofile')
+PROFILE_SKIP = int(os.environ.get('BIRD_PROFILE_SKIP', 0))
+ENABLED = os.environ.get('BIRD_INSTRUMENT', '') not in ('', '0') or bool(PROFILE_STAGE)
+OUTPUT = os.environ.get('BIRD_INSTRUMENT_OUTPUT')
+
+# Timers with a histogram of durations, and plain counters
+class Stats:
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        # Histogram buckets are powers of two in milliseconds, keyed by their upper bound
+        bucket = 2.0 ** math.ceil(math.log2(max(seconds * 1000, 1e-3)))
+        with self.lock:
+            stat = self.timers.get(name)
+            if stat is None:
+                stat = self.timers[name] = {'count': 0, 'total': 0.0, 'min': seconds, 'max': seconds, 'histogram': {}}
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['min'] = min(stat['min'], seconds)
+            stat['max'] = max(stat['max'], seconds)
+            stat['histogram'][bucket] = stat['histogram'].get(bucket, 0) + 1
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self, file=sys.stderr):
+        with self.lock:
+            timers = sorted(self.timers.items(), key=lambda item: -item[1]['total'])
+            counters = sorted(self.counters.items())
+        print(f"\nStage timings (pid {os.getpid()})", file=file)
+        print(f"{'stage':<28}{'calls':>8}{'total s':>10}{'mean ms':>10}{'min ms':>10}{'max ms':>10}", file=file)
+        for name, stat in timers:
+            print(f"{name:<28}{stat['count']:>8}{stat['total']:>10.3f}{stat['total'] / stat['count'] * 1000:>10.2f}"
+                  f"{stat['min'] * 1000:>10.2f}{stat['max'] * 1000:>10.2f}", file=file)
+            histogram = ", ".join(f"<={bucket:g}ms: {n}" for bucket, n in sorted(stat['histogram'].items()))
+            print(f"{'':<28}{histogram}", file=file)
+        for name, value in counters:
+            print(f"{name:<28}{value:>8}", file=file)
+
+    def to_dict(self):
+        with self.lock:
+            timers = {name: dict(stat, histogram={str(bucket): n for bucket, n in sorted(stat['histogram'].items())})
+                      for name, stat in self.timers.items()}
+            return {'pid': os.getpid(), 'timers': timers, 'counters': dict(self.counters)}
+
+# cProfile over every call of one stage, or torch.profiler over a single call
+class StageProfiler:
+    def __init__(self, stage, kind):
+        self.stage = stage
+        self.kind = kind
+        self.calls = 0
+        self.profile = cProfile.Profile() if kind == 'cprofile' else None
+        self.torch_profile = None
+
+    def start(self):
+        self.calls += 1
+        if self.calls <= PROFILE_SKIP:
+            return False
+        if self.kind == 'torch':
+            if self.torch_profile is not None:
+                return False
+            import torch.profiler
+            self.torch_profile = torch.profiler.profile(record_shapes=True)
+            self.torch_profile.__enter__()
+            return True
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another thread is already inside the profiled stage
+            return False
+        return True
+
+    def stop(self):
+        if self.kind == 'torch':
+            self.torch_profile.__exit__(None, None, None)
+        else:
+            self.profile.disable()
+
+    def report(self, file=sys.stderr):
+        if self.kind == 'torch':
+            if self.torch_profile is None:
+                return
+            print(f"\ntorch.profiler, one call of {self.stage}", file=file)
+            print(self.torch_profile.key_averages().table(sort_by='self_cpu_time_total', row_limit=20), file=file)
+            self.torch_profile.export_chrome_trace(f'{self.stage}.trace.json')
+            print(f"Chrome trace written to {self.stage}.trace.json", file=file)
+        elif self.calls > PROFILE_SKIP:
+            print(f"\ncProfile of {self.stage}, {self.calls - PROFILE_SKIP} calls", file=file)
+            self.profile.dump_stats(f'{self.stage}.prof')
+            pstats.Stats(self.profile, stream=file).sort_stats('cumulative').print_stats(20)
+            print(f"Profile written to {self.stage}.prof", file=file)
+
+_stats = Stats()
+_profiler = StageProfiler(PROFILE_STAGE, PROFILER) if PROFILE_STAGE else None
+_NULL = nullcontext()
+
+class _Timer:
+    __slots__ = ('name', 'start', 'profiling')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.profiling = _profiler is not None and self.name == PROFILE_STAGE and _profiler.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _stats.record(self.name, time.perf_counter() - self.start)
+        if self.profiling:
+            _profiler.stop()
+
+def timer(name):
+    # Context manager timing one stage; a shared no-op when instrumentation is off
+    return _Timer(name) if ENABLED else _NULL
+
+def timed(name):
+    # Decorator timing every call of a function; leaves the function untouched when instrumentation is off
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, n=1):
+    if ENABLED:
+        _stats.count(name, n)
+
+def stats():
+    return _stats.to_dict()
+
+def dump():
+    _stats.report()
+    if _profiler:
+        _profiler.report()
+    if OUTPUT:
+        with open(OUTPUT, 'w') as f:
+            json.dump(_stats.to_dict(), f, indent=2)
+
+if ENABLED:
+    atexit.register(dump)
@@ -0,0 +1,85 @@
+import csv
+import hashlib
+import os
+import re
+from features import find_audio_files
+
+SPLITS = ('train', 'test', 'validate')
+SPLIT_RATIOS = {'train': 0.7, 'test': 0.2, 'validate': 0.1}
+FIELDS = ['path', 'species', 'recording_id', 'split', 'size', 'mtime']
+
+def recording_id(filename):
+    # Variants of one xeno-canto recording share the XC12345 prefix and must stay in the same split,
+    # other files are their own recording
+    match = re.match(r'XC\d+', filename)
+    return match.group(0) if match else os.path.splitext(filename)[0]
+
+def read_manifest(manifest_path):
+    # Rows of the manifest, with paths relative to the manifest's folder
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def write_manifest(manifest_path, rows):
+    # Write to a temporary file first so an interrupted run keeps the previous manifest
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda row: (row['species'], row['path'])))
+    os.replace(temp_path, manifest_path)
+
+def _group_order(seed, species, group):
+    # Deterministic pseudo-random order of the recordings, independent of directory listing order
+    return hashlib.sha1(f"{seed}/{species}/{group}".encode()).hexdigest()
+
+def build_manifest(base_dir, dataset_dir, previous_rows=(), seed=42, ratios=SPLIT_RATIOS):
+    # Assign every recording under dataset_dir to a split, stratified per species and grouped by
+    # recording ID. Recordings already in the previous manifest keep their split, new ones go to
+    # the split that is furthest below its target share for their species.
+    previous_splits = {(row['species'], row['recording_id']): row['split'] for row in previous_rows}
+
+    groups = {}
+    for audio_path, species in find_audio_files(dataset_dir):
+        stat = os.stat(audio_path)
+        row = {
+            'path': os.path.relpath(audio_path, base_dir).replace(os.sep, '/'),
+            'species': species,
+            'recording_id': recording_id(os.path.basename(audio_path)),
+            'split': None,
+            'size': str(stat.st_size),
+            'mtime': str(stat.st_mtime_ns),
+        }
+        groups.setdefault((species, row['recording_id']), []).append(row)
+
+    assigned = {}
+    new_groups = []
+    for key, rows in groups.items():
+        species = key[0]
+        counts = assigned.setdefault(species, dict.fromkeys(ratios, 0))
+        split = previous_splits.get(key)
+        if split in ratios:
+            counts[split] += len(rows)
+            for row in rows:
+                row['split'] = split
+        else:
+            new_groups.append(key)
+
+    for key in sorted(new_groups, key=lambda key: _group_order(seed, *key)):
+        species = key[0]
+        rows = groups[key]
+        counts = assigned[species]
+        total = sum(counts.values()) + len(rows)
+        split = max(ratios, key=lambda s: ratios[s] * total - counts[s])
+        counts[split] += len(rows)
+        for row in rows:
+            row['split'] = split
+
+    return [row for rows in groups.values() for row in rows]
+
+def manifest_files(manifest_path, split=None):
+    # (path, species) pairs from the manifest, optionally for one split only
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    return [(os.path.join(base_dir, *row['path'].split('/')), row['species'])
+            for row in read_manifest(manifest_path) if split is None or row['split'] == split]
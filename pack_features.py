@@ -0,0 +1,19 @@
+import argparse
+import time
+from bird_datasets import BirdAudioDataset, pack_dataset
+from features import FEATURE_KINDS
+
+# One-time step: compute the model inputs for every recording and pack them into a memory-mapped file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack preprocessed spectrogram features into a memory-mapped store")
+    parser.add_argument('--input', default='dataset', help="Folder with <species>/<audio> files")
+    parser.add_argument('--output', default='features/dataset', help="Store path, written as <output>.npy and <output>.json")
+    parser.add_argument('--features', default='stft', choices=FEATURE_KINDS)
+    parser.add_argument('--workers', type=int, default=4, help="DataLoader worker processes used for featurising")
+    args = parser.parse_args()
+
+    dataset = BirdAudioDataset(args.input, feature_kind=args.features)
+    start = time.perf_counter()
+    pack_dataset(dataset, args.output, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Packed {len(dataset)} samples into {args.output}.npy in {elapsed:.1f}s ({len(dataset) / elapsed:.1f} samples/s)")
@@ -0,0 +1,110 @@
+import argparse
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from inference import BirdPredictor, display_name
+
+# Runs predictions on a thread pool and hands each outcome back through a queue, so a Tk app can
+# poll it from the main loop with after() and a command-line tool can simply wait for it.
+# Threads share one loaded model; torch and the audio decoders release the GIL while they work.
+# With an embedding_index.SimilaritySearch the results also list the closest reference recordings.
+class PredictionQueue:
+    def __init__(self, predictor, workers=1, top_k=3, search=None, neighbours=5):
+        self.predictor = predictor
+        self.top_k = top_k
+        self.search = search
+        self.neighbours = neighbours
+        self.pool = ThreadPoolExecutor(workers)
+        self.events = queue.Queue()
+        self.futures = []
+        self.submitted = 0
+        self.finished = 0
+        self.lock = threading.Lock()
+
+    def submit(self, audio_path):
+        future = self.pool.submit(self._predict, audio_path)
+        with self.lock:
+            self.futures.append(future)
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._finished(audio_path, f))
+        return future
+
+    def _predict(self, audio_path):
+        result = self.predictor.predict(audio_path, self.top_k)
+        if self.search:
+            result['neighbours'] = self.search.neighbours(result['spectrogram'], self.neighbours)
+        return result
+
+    def _finished(self, audio_path, future):
+        # Called on the worker thread (or the cancelling one), only the queue crosses threads
+        if future.cancelled():
+            event = {'path': audio_path, 'status': 'cancelled'}
+        elif future.exception() is not None:
+            event = {'path': audio_path, 'status': 'error', 'error': future.exception()}
+        else:
+            event = {'path': audio_path, 'status': 'done', 'result': future.result()}
+        with self.lock:
+            self.finished += 1
+            self.futures.remove(future)
+            self.events.put(event)
+
+    def cancel(self):
+        # Drop the files that haven't started, a prediction already running finishes normally
+        with self.lock:
+            futures = list(self.futures)
+        return sum(future.cancel() for future in futures)
+
+    def poll(self):
+        # Events that arrived since the last call, without blocking
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def progress(self):
+        with self.lock:
+            return self.finished, self.submitted
+
+    def busy(self):
+        finished, submitted = self.progress()
+        return finished < submitted
+
+    def results(self):
+        # Blocking iteration over the events in completion order until every submitted file is done
+        while True:
+            with self.lock:
+                done = self.finished == self.submitted and self.events.empty()
+            if done:
+                return
+            yield self.events.get()
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict the bird species of audio files in the background")
+    parser.add_argument('audio', nargs='+', help="Audio files")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=3)
+    args = parser.parse_args()
+
+    jobs = PredictionQueue(BirdPredictor(args.model), args.workers, args.top_k)
+    for audio_path in args.audio:
+        jobs.submit(audio_path)
+    try:
+        for event in jobs.results():
+            finished, submitted = jobs.progress()
+            if event['status'] == 'done':
+                predictions = ", ".join(f"{display_name(species)} ({p:.1%})" for species, p in event['result']['predictions'])
+                print(f"[{finished}/{submitted}] {event['path']}: {predictions}")
+            elif event['status'] == 'error':
+                print(f"[{finished}/{submitted}] {event['path']}: error: {event['error']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print(f"Cancelled {jobs.cancel()} pending files", file=sys.stderr)
+    finally:
+        jobs.shutdown()
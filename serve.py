@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import torch
+from features import compute_features, load_audio
+from inference import BirdPredictor
+
+# Collects model inputs from concurrent requests and runs them through the model in one forward pass
+class MicroBatcher:
+    def __init__(self, predictor, max_batch_size=16, max_wait_ms=10):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=10000)
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, inputs):
+        future = Future()
+        self.requests.put((inputs, future))
+        return future
+
+    def _run(self):
+        while True:
+            # Block for the first request, then wait at most max_wait for more to join the batch
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            try:
+                probabilities = self.predictor.predict_features(torch.stack([inputs for inputs, _ in batch]))
+                for (_, future), p in zip(batch, probabilities):
+                    future.set_result(p)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+# Request latencies and throughput over the most recent requests
+class Metrics:
+    def __init__(self):
+        self.latencies = deque(maxlen=10000)
+        self.finished = deque(maxlen=10000)
+        self.errors = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.finished.append(time.time())
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def summary(self, batch_sizes):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            finished = list(self.finished)
+        summary = {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'uptime_s': round(time.time() - self.started, 1),
+            'mean_batch_size': round(float(np.mean(batch_sizes)), 2) if batch_sizes else 0.0,
+        }
+        if len(latencies):
+            summary['latency_p50_ms'] = round(float(np.percentile(latencies, 50)), 1)
+            summary['latency_p95_ms'] = round(float(np.percentile(latencies, 95)), 1)
+        if len(finished) > 1 and finished[-1] > finished[0]:
+            summary['throughput_rps'] = round((len(finished) - 1) / (finished[-1] - finished[0]), 2)
+        return summary
+
+def error_message(e):
+    # Some decoder errors carry no message, fall back to the exception type
+    return str(e) or type(e).__name__
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # Set by run_server
+    batcher = None
+    metrics = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'status': 'ok', 'classes': self.batcher.predictor.classes})
+        elif path == '/metrics':
+            self._send_json(200, self.metrics.summary(list(self.batcher.batch_sizes)))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        start = time.perf_counter()
+        query = parse_qs(url.query)
+        try:
+            top_k = int(query.get('top_k', ['3'])[0])
+        except ValueError:
+            top_k = 0
+        if top_k < 1:
+            self._send_json(400, {'error': 'top_k must be a positive integer'})
+            return
+        filename = query.get('filename', ['upload.mp3'])[0]
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {'error': 'Content-Length must be a non-negative integer'})
+            return
+        if length == 0:
+            self._send_json(400, {'error': 'empty request body, send the audio file as the body'})
+            return
+
+        try:
+            # Decoders need a file, keep the extension so the format is detected
+            with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as f:
+                f.write(self.rfile.read(length))
+            try:
+                y, sr = load_audio(f.name)
+            finally:
+                os.remove(f.name)
+
+            predictor = self.batcher.predictor
+            inputs = compute_features(y, sr, predictor.feature_kind)
+        except Exception as e:
+            # The upload couldn't be decoded, the client's fault
+            self.metrics.record_error()
+            self._send_json(400, {'error': f"could not decode the audio: {error_message(e)}"})
+            return
+
+        try:
+            probabilities = self.batcher.submit(inputs).result()
+            predictions = predictor.top_predictions(probabilities, top_k)
+        except Exception as e:
+            self.metrics.record_error()
+            self._send_json(500, {'error': f"prediction failed: {error_message(e)}"})
+            return
+
+        latency = time.perf_counter() - start
+        self.metrics.record(latency)
+        self._send_json(200, {
+            'predictions': [{'species': species, 'probability': round(p, 4)} for species, p in predictions],
+            'latency_ms': round(latency * 1000, 1),
+        })
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet under load, /metrics has the numbers
+        pass
+
+def run_server(model_path='alexnet.pth', host='127.0.0.1', port=8000, max_batch_size=16, max_wait_ms=10):
+    PredictionHandler.batcher = MicroBatcher(BirdPredictor(model_path), max_batch_size, max_wait_ms)
+    PredictionHandler.metrics = Metrics()
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    print(f"Serving {model_path} on http://{host}:{port} (batch size {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve bird species predictions over HTTP")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    run_server(args.model, args.host, args.port, args.max_batch_size, args.max_wait_ms)
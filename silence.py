@@ -0,0 +1,97 @@
+import numpy as np
+import soundfile as sf
+from instrumentation import timed
+
+# Frames whose RMS level is more than 40 dB below the reference are treated as silence. The
+# in-memory functions measure from the loudest frame; streaming can't know the loudest frame in
+# advance and measures from full scale instead, with a lower threshold of -50 dBFS
+THRESHOLD_DB = -40.0
+STREAM_THRESHOLD_DB = -50.0
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+@timed('silence.frame_rms')
+def frame_rms(audio, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    # RMS of one frame centred on every hop_length block of samples. The energy of each block is
+    # computed once and frames sum neighbouring blocks, instead of squaring every sample once per
+    # overlapping frame.
+    if frame_length % hop_length:
+        raise ValueError("frame_length must be a multiple of hop_length")
+    n_full = len(audio) // hop_length
+    blocks = audio[:n_full * hop_length].reshape(n_full, hop_length)
+    block_energy = np.einsum('ij,ij->i', blocks, blocks, dtype=np.float64)
+    tail = audio[n_full * hop_length:]
+    if len(tail):
+        block_energy = np.append(block_energy, np.dot(tail, tail))
+    if len(block_energy) == 0:
+        return block_energy
+
+    # Sum frame_length // hop_length neighbouring blocks around each block
+    blocks_per_frame = frame_length // hop_length
+    frame_energy = np.convolve(block_energy, np.ones(blocks_per_frame))
+    frame_energy = frame_energy[blocks_per_frame // 2:blocks_per_frame // 2 + len(block_energy)]
+    return np.sqrt(np.maximum(frame_energy, 0.0) / frame_length)
+
+def activity_mask(audio, threshold_db=THRESHOLD_DB, ref=None, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    # Boolean mask over the samples, True where the surrounding frame is louder than
+    # threshold_db relative to ref (the loudest frame if ref is None, 1.0 for dBFS)
+    rms = frame_rms(audio, frame_length, hop_length)
+    if ref is None:
+        ref = rms.max() if len(rms) else 0.0
+    active = rms >= ref * 10.0 ** (threshold_db / 20.0)
+    return np.repeat(active, hop_length)[:len(audio)]
+
+@timed('silence.remove')
+def remove_silence(audio, threshold_db=THRESHOLD_DB, ref=None, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    # Keep the non-silent samples with a single boolean gather
+    return audio[activity_mask(audio, threshold_db, ref, frame_length, hop_length)]
+
+def remove_silence_blocks(blocks, threshold_db=STREAM_THRESHOLD_DB, ref=1.0, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    # Streaming version for recordings too long to hold in memory. The threshold needs a fixed
+    # reference (dBFS by default) because the loudest frame isn't known until the end, so the
+    # defaults differ from remove_silence; with the same threshold_db and ref the output is the same.
+    # Each block is emitted once the next one has arrived, so frames on the block edges see
+    # the real neighbouring samples instead of zero padding.
+    previous_tail = np.zeros(0, dtype=np.float32)
+    current = None
+    for block in blocks:
+        if current is not None:
+            yield _remove_silence_with_context(previous_tail, current, block[:frame_length],
+                                               threshold_db, ref, frame_length, hop_length)
+            previous_tail = current[-frame_length:]
+        current = block
+    if current is not None:
+        yield _remove_silence_with_context(previous_tail, current, np.zeros(0, dtype=np.float32),
+                                           threshold_db, ref, frame_length, hop_length)
+
+def _remove_silence_with_context(before, block, after, threshold_db, ref, frame_length, hop_length):
+    mask = activity_mask(np.concatenate([before, block, after]), threshold_db, ref, frame_length, hop_length)
+    return block[mask[len(before):len(before) + len(block)]]
+
+def read_blocks(audio_path, block_seconds=60):
+    # Read a file in fixed-size blocks, downmixed to mono, without decoding all of it at once.
+    # Blocks are a whole number of hops so the frame grid lines up across blocks.
+    with sf.SoundFile(audio_path) as f:
+        blocksize = max(1, int(block_seconds * f.samplerate) // HOP_LENGTH) * HOP_LENGTH
+        for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            yield block.mean(axis=1)
+
+@timed('silence.remove_file')
+def remove_silence_file(audio_path, output_path, threshold_db=STREAM_THRESHOLD_DB, ref=1.0, block_seconds=60):
+    # Write the non-silent parts of a long recording to output_path block by block, relative to
+    # full scale unless ref is given; returns the number of input and kept samples
+    total = 0
+    kept = 0
+
+    def counted(blocks):
+        nonlocal total
+        for block in blocks:
+            total += len(block)
+            yield block
+
+    samplerate = sf.info(audio_path).samplerate
+    with sf.SoundFile(output_path, 'w', samplerate=samplerate, channels=1) as out:
+        for voiced in remove_silence_blocks(counted(read_blocks(audio_path, block_seconds)), threshold_db, ref):
+            out.write(voiced)
+            kept += len(voiced)
+    return total, kept
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import json
+import sys
+import time
+import numpy as np
+import soundfile as sf
+import soxr
+import torch
+from features import SAMPLE_RATE, compute_features
+from inference import BirdPredictor
+from resources import peak_memory_mb
+
+def read_resampled(audio_path, sr=SAMPLE_RATE, block_seconds=30):
+    # Read the file block by block, downmixed to mono and resampled to the model's sample rate
+    with sf.SoundFile(audio_path) as f:
+        resampler = soxr.ResampleStream(f.samplerate, sr, 1, dtype='float32') if f.samplerate != sr else None
+        for block in f.blocks(blocksize=int(block_seconds * f.samplerate), dtype='float32', always_2d=True):
+            block = block.mean(axis=1)
+            yield resampler.resample_chunk(block) if resampler else block
+        if resampler:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+def sliding_windows(blocks, window_length, hop_length):
+    # Yield (start sample, window) pairs over a stream of blocks. Only the samples that the next
+    # windows still need are kept, so memory doesn't grow with the length of the recording.
+    buffer = np.zeros(0, dtype=np.float32)
+    start = 0
+    covered = 0
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= window_length:
+            yield start, buffer[:window_length]
+            covered = start + window_length
+            buffer = buffer[hop_length:]
+            start += hop_length
+
+    # Pad the last window if the end of the recording isn't covered yet
+    if start + len(buffer) > covered:
+        yield start, np.pad(buffer, (0, window_length - len(buffer)))
+
+def detect(predictor, audio_path, window_seconds=5.0, hop_seconds=2.5, batch_size=32,
+           min_confidence=0.5, ignore=('ambient',), torch_frontend=False):
+    # Generator of timestamped detections in a long recording. With torch_frontend the windows go
+    # to the model as waveforms and the whole batch is featurised in the same call.
+    window_length = int(window_seconds * SAMPLE_RATE)
+    hop_length = int(hop_seconds * SAMPLE_RATE)
+    # A hop of zero never advances, and one longer than the window would skip audio between windows
+    if window_length <= 0 or not 0 < hop_length <= window_length:
+        raise ValueError(f"Need 0 < hop <= window, got window {window_seconds}s and hop {hop_seconds}s")
+    windows = sliding_windows(read_resampled(audio_path), window_length, hop_length)
+
+    batch = []
+    starts = []
+    for start, window in windows:
+        batch.append(window if torch_frontend else compute_features(window, SAMPLE_RATE, predictor.feature_kind))
+        starts.append(start)
+        if len(batch) == batch_size:
+            yield from _detections(predictor, batch, starts, window_seconds, min_confidence, ignore, torch_frontend)
+            batch = []
+            starts = []
+    if batch:
+        yield from _detections(predictor, batch, starts, window_seconds, min_confidence, ignore, torch_frontend)
+
+def _detections(predictor, batch, starts, window_seconds, min_confidence, ignore, torch_frontend):
+    # One forward pass for the whole batch of windows
+    if torch_frontend:
+        probabilities = predictor.predict_waveforms(batch)
+    else:
+        probabilities = predictor.predict_features(torch.stack(batch))
+    confidences, indices = probabilities.max(dim=1)
+    for start, confidence, index in zip(starts, confidences.tolist(), indices.tolist()):
+        species = predictor.classes[index]
+        if confidence >= min_confidence and species not in ignore:
+            yield {
+                'start': round(start / SAMPLE_RATE, 3),
+                'end': round(start / SAMPLE_RATE + window_seconds, 3),
+                'species': species,
+                'confidence': round(confidence, 4),
+            }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect bird species along a long field recording")
+    parser.add_argument('audio', nargs='+', help="Recordings to scan")
+    parser.add_argument('--model', default='alexnet.pth')
+    parser.add_argument('--window', type=float, default=5.0, help="Window length in seconds")
+    parser.add_argument('--hop', type=float, default=2.5, help="Hop between windows in seconds")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--min-confidence', type=float, default=0.5)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    parser.add_argument('--torch-frontend', action='store_true', help="Compute the spectrograms of each batch with torch inside the model call")
+    args = parser.parse_args()
+    if args.window <= 0 or not 0 < args.hop <= args.window:
+        parser.error("--hop must be greater than 0 and at most --window")
+
+    predictor = BirdPredictor(args.model)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    fields = ['file', 'start', 'end', 'species', 'confidence']
+    writer = csv.DictWriter(output, fieldnames=fields) if args.format == 'csv' else None
+    if writer:
+        writer.writeheader()
+
+    audio_seconds = 0.0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for audio_path in args.audio:
+        audio_seconds += sf.info(audio_path).duration
+        for detection in detect(predictor, audio_path, args.window, args.hop, args.batch_size, args.min_confidence,
+                                torch_frontend=args.torch_frontend):
+            detection = {'file': audio_path, **detection}
+            if writer:
+                writer.writerow(detection)
+            else:
+                output.write(json.dumps(detection) + '\n')
+            output.flush()
+    if args.output:
+        output.close()
+
+    # Throughput summary on stderr so it doesn't mix with the detections
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    print(f"Processed {audio_seconds / 3600:.2f} audio hours in {wall_time:.1f}s wall, {cpu_time:.1f}s CPU: "
+          f"{audio_seconds / max(cpu_time, 1e-9):.0f} audio-hours per CPU-hour, "
+          f"{audio_seconds / max(wall_time, 1e-9):.0f}x real time", file=sys.stderr)
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.0f} MB", file=sys.stderr)
@@ -0,0 +1,82 @@
+import librosa
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from features import IMAGE_SIZE, N_MELS, SAMPLE_RATE
+
+# librosa defaults used by features.log_spectrogram and features.log_mel_spectrogram
+N_FFT = 2048
+HOP_LENGTH = 512
+TOP_DB = 80.0
+
+def pad_batch(waveforms):
+    # Zero-pad a list of 1-D waveforms into one (batch, samples) tensor, with the original lengths
+    lengths = torch.tensor([len(y) for y in waveforms])
+    batch = torch.zeros(len(waveforms), int(lengths.max()) if len(waveforms) else 0)
+    for i, y in enumerate(waveforms):
+        batch[i, :len(y)] = torch.as_tensor(np.asarray(y, dtype=np.float32))
+    return batch, lengths
+
+# Batched torch version of features.compute_features: STFT, optional mel filterbank, dB relative to
+# each clip's peak, then the same scaling, flip, resize and normalisation. The window and the
+# filterbank are computed once and kept as buffers. Large batches are processed chunk_size clips at a
+# time, the complex spectrogram of a whole batch of 256 clips is too large to stay in cache.
+class SpectrogramFrontEnd(nn.Module):
+    def __init__(self, kind='stft', sr=SAMPLE_RATE, size=IMAGE_SIZE, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS,
+                 chunk_size=8):
+        super(SpectrogramFrontEnd, self).__init__()
+        if kind not in ('stft', 'mel'):
+            raise ValueError(f"Unknown feature kind {kind!r}, expected 'stft' or 'mel'")
+        self.kind = kind
+        self.size = size
+        self.chunk_size = chunk_size
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.register_buffer('window', torch.hann_window(n_fft))
+        if kind == 'mel':
+            # librosa's Slaney filterbank, so the output matches log_mel_spectrogram
+            self.register_buffer('mel_basis', torch.from_numpy(librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)))
+
+    def forward(self, waveforms, lengths=None):
+        # (batch, samples) float waveforms -> (batch, 1, size, size) model inputs
+        if len(waveforms) > self.chunk_size:
+            chunk_lengths = lengths.split(self.chunk_size) if lengths is not None else [None] * len(waveforms)
+            return torch.cat([self._features(chunk, n) for chunk, n in zip(waveforms.split(self.chunk_size), chunk_lengths)])
+        return self._features(waveforms, lengths)
+
+    def _features(self, waveforms, lengths):
+        spec = torch.stft(waveforms, self.n_fft, self.hop_length, window=self.window, center=True,
+                          pad_mode='constant', return_complex=True)
+        # Power from the real and imaginary parts, much faster than the complex abs(); 10 log10 of
+        # the power with amin 1e-10 equals amplitude_to_db's 20 log10 of the magnitude with amin 1e-5
+        power = spec.real ** 2 + spec.imag ** 2
+        if self.kind == 'mel':
+            power = torch.matmul(self.mel_basis, power)
+        db = power.clamp_(min=1e-10).log10_().mul_(10.0)
+
+        # dB relative to the clip's peak and clipped at TOP_DB below it, as amplitude_to_db(ref=np.max).
+        # Padding is silent, so it doesn't move the peak.
+        db = db - db.amax(dim=(1, 2), keepdim=True)
+        image = (db.clamp(-TOP_DB, 0.0) + TOP_DB) / TOP_DB
+        image = image.flip(1).unsqueeze(1)
+
+        if lengths is None or bool((lengths == lengths[0]).all()):
+            if lengths is not None:
+                image = image[..., :int(lengths[0]) // self.hop_length + 1]
+            image = F.interpolate(image, size=(self.size, self.size), mode='bilinear', align_corners=False)
+        else:
+            # Clips of different lengths: drop each one's padded frames before resizing it
+            image = torch.cat([F.interpolate(image[i:i + 1, ..., :int(n) // self.hop_length + 1], size=(self.size, self.size),
+                                             mode='bilinear', align_corners=False) for i, n in enumerate(lengths)])
+        return (image - 0.5) / 0.5
+
+# Classifier with the front-end as its first layer, so one call goes from waveforms to logits
+class FeatureModel(nn.Module):
+    def __init__(self, frontend, model):
+        super(FeatureModel, self).__init__()
+        self.frontend = frontend
+        self.model = model
+
+    def forward(self, waveforms, lengths=None):
+        return self.model(self.frontend(waveforms, lengths))